@@ -23,11 +23,17 @@ They need to implment these methods: rms, tell, setpos, rewind, readframes,
 write_frames, and the attributes frames and framerate. """
 
 import audioop
+import array
+import bisect
+import errno
+import math
+import mmap
+import warnings
 import wave
 import sys
 import os
 
-from findsilence import defaults
+from findsilence import defaults, wave64
 
 __version__ = "0.1rc1"
 __author__ = "Florian Mayer <flormayer@aim.com>"
@@ -38,7 +44,40 @@ __bugs__ = ""
 
 
 
+try:
+    _view = buffer
+except NameError:
+    # Python 3 has no buffer, but mmap supports memoryview there.
+    def _view(obj, offset, size):
+        return memoryview(obj)[offset:offset + size]
+
+# Extensions of the files opened as wave files by Audio.from_file.
+WAVE_EXTENSIONS = ('.wav', '.bwf', '.rf64', '.w64')
+
+# Available silence detection engines. "numpy" falls back to "python" if
+# NumPy is not installed.
+ENGINES = ('python', 'numpy')
+
+
+def get_engine(engine):
+    """ Return the module implementing engine or None for the pure Python
+    engine implemented in Audio. """
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine %r" % (engine, ))
+    if engine == 'numpy':
+        try:
+            from findsilence import vectorized
+        except ImportError:
+            return None
+        return vectorized
+    return None
+
+
 class DummyNotifier(object):
+    """ Notifier that ignores all events. Notifiers should inherit from it,
+    so that they only need to override the events they are interested in.
+    Phases are only reported a few times per file, so notifying them costs
+    nothing noticeable. findsilence.instrument.Collector records them. """
     def current_frame(self, frame):
         pass
     
@@ -47,13 +86,51 @@ class DummyNotifier(object):
     
     def done(self):
         pass
+    
+    def phase_start(self, name):
+        """ Phase name, e.g. 'envelope' or 'write', has begun. """
+        pass
+    
+    def phase_end(self, name, frames=None):
+        """ Phase name has ended after processing frames frames. """
+        pass
+    
+    def count(self, name, n=1):
+        """ Add n to the counter name, e.g. 'bytes_read'. """
+        pass
+
+
+class NotifierAdapter(DummyNotifier):
+    """ Wraps a notifier that does not inherit from DummyNotifier, such as
+    one implementing only current_frame, total_frames and done. The events
+    it does not implement are ignored. """
+    events = ('current_frame', 'total_frames', 'done', 'phase_start',
+              'phase_end', 'count')
+    
+    def __init__(self, notifier):
+        self.notifier = notifier
+        for name in self.events:
+            method = getattr(notifier, name, None)
+            if method is not None:
+                setattr(self, name, method)
+
+
+def get_notifier(parent_thread):
+    """ Return the notifier of parent_thread, wrapped in a NotifierAdapter
+    unless it implements all events of DummyNotifier. """
+    notifier = parent_thread.notifier
+    if isinstance(notifier, DummyNotifier):
+        return notifier
+    return NotifierAdapter(notifier)
 
 
 class DummyThread:
     """ Dummy Thread that is used when the functions are used without
     a parent_thread argument """
-    def __init__(self):
-        self.notifier = DummyNotifier()
+    def __init__(self, notifier=None):
+        if notifier is None:
+            notifier = DummyNotifier()
+        self.notifier = notifier
     
     def is_stopped(self):
         return False
@@ -74,9 +151,399 @@ class NoSilence(Exception):
     pass
 
 
+class TrackCountWarning(UserWarning):
+    """ Issued when a file cannot be split into the requested amount of 
+    tracks. smaller and larger are the closest amounts it can be split
+    into, or None. """
+    def __init__(self, tracks, smaller, larger):
+        possible = " or ".join(str(count) for count in (smaller, larger)
+                               if count is not None) or "no"
+        UserWarning.__init__(
+            self, "Cannot split into %d tracks, closest possible are %s "
+            "tracks" % (tracks, possible)
+        )
+        self.tracks = tracks
+        self.smaller = smaller
+        self.larger = larger
+
+
+def find_tracks(silence, min_length, framerate):
+    """ Yield the (from_pos, to_pos) ranges between the pauses in silence 
+    that are at least min_length seconds long. """
+    from_pos = 0
+    for to_pos, next_from in silence:
+        if (to_pos - from_pos) >= min_length * framerate:
+            # Track is long enough to be considered a track.
+            yield from_pos, to_pos
+        from_pos = next_from
+
+
+class Stats(object):
+    """ Loudness statistics gathered window by window in constant memory: 
+    the overall volume, the minimum and maximum volume of blocks of 
+    block_windows windows and a histogram of the window volumes. """
+    # Resolution of the histogram. Volumes up to 200 dB cover 32 bit samples.
+    bins_per_db = 4
+    max_db = 200
+    
+    def __init__(self, block_windows, window_frames=None):
+        self.block_windows = block_windows
+        self.window_frames = window_frames
+        self.energy = 0.0
+        self.frames = 0
+        self.windows = 0
+        self.histogram = array.array('L', [0] * (self.max_db * 
+                                                 self.bins_per_db + 1))
+        self._block_energy = 0.0
+        self._block_frames = 0
+        self._block_windows = 0
+        self._min = None
+        self._max = None
+    
+    def add(self, rms, frames):
+        """ Add a window of frames frames with a volume of rms. """
+        energy = rms * rms * frames
+        self.energy += energy
+        self.frames += frames
+        self.windows += 1
+        self.histogram[self.bin(rms)] += 1
+        self._block_energy += energy
+        self._block_frames += frames
+        self._block_windows += 1
+        if self._block_windows == self.block_windows:
+            self._end_block()
+    
+    def bin(self, rms):
+        """ Index of the histogram bin rms belongs to. """
+        if rms < 1:
+            return 0
+        return min(int(20 * math.log10(rms) * self.bins_per_db), 
+                   len(self.histogram) - 1)
+    
+    def _end_block(self):
+        if self._block_frames:
+            amplitude = int(math.sqrt(self._block_energy / self._block_frames))
+            if self._min is None or amplitude < self._min:
+                self._min = amplitude
+            if self._max is None or amplitude > self._max:
+                self._max = amplitude
+        self._block_energy = 0.0
+        self._block_frames = 0
+        self._block_windows = 0
+    
+    @property
+    def max_amplitude(self):
+        """ Maximal volume of a block. """
+        self._end_block()
+        return self._max
+    
+    @property
+    def min_amplitude(self):
+        """ Minimum volume of a block. """
+        self._end_block()
+        return self._min
+    
+    @property
+    def volume(self):
+        """ Root-mean-square of everything added. """
+        if not self.frames:
+            return 0
+        return int(math.sqrt(self.energy / self.frames))
+    
+    def percentile(self, percent):
+        """ Volume below which percent percent of the windows are. It is
+        accurate to 1 / bins_per_db dB. """
+        rank = percent / 100.0 * self.windows
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return 10 ** (i / float(self.bins_per_db) / 20)
+        return 0
+    
+    def median(self):
+        """ Median window volume. """
+        return self.percentile(50)
+
+
+class Envelope(object):
+    """ Loudness envelope of a file. It holds the root-mean-square of every
+    window of window_frames frames in an array, so that silence detection,
+    threshold search and amplitude estimation can run without reading the
+    file again. """
+    # Amount of volume caps split_into tries before it bisects.
+    grid_caps = 32
+    
+    def __init__(self, frames, framerate, window_frames, rms=None):
+        self.frames = frames
+        self.framerate = framerate
+        self.window_frames = window_frames
+        if rms is None:
+            rms = array.array('d')
+        self.rms = rms
+        self._power = None
+        self._levels = None
+        self._stats = None
+        self._max_amplitude = None
+        self._min_amplitude = None
+    
+    def __len__(self):
+        return len(self.rms)
+    
+    def windows(self, seconds):
+        """ Amount of windows needed to cover seconds, at least one. """
+        return max(1, int(round(seconds * self.framerate / 
+                                float(self.window_frames))))
+    
+    def position(self, window):
+        """ Frame at which window starts. """
+        return min(window * self.window_frames, self.frames)
+    
+    @property
+    def power(self):
+        """ Cumulative energy of the windows. power[j] - power[i] is the
+        energy of the windows i to j. It grows along with rms. """
+        if self._power is None:
+            self._power = array.array('d', [0.0])
+        power = self._power
+        if len(power) <= len(self.rms):
+            total = power[-1]
+            for i in xrange(len(power) - 1, len(self.rms)):
+                rms = self.rms[i]
+                total += rms * rms * (self.position(i + 1) - self.position(i))
+                power.append(total)
+        return power
+    
+    @property
+    def levels(self):
+        """ Sorted distinct window volumes. """
+        if self._levels is None or self._levels[0] != len(self.rms):
+            self._levels = (len(self.rms), 
+                            array.array('d', sorted(set(self.rms))))
+        return self._levels[1]
+    
+    def block_rms(self, start, end):
+        """ Root-mean-square of the windows start to end. """
+        frames = self.position(end) - self.position(start)
+        if not frames:
+            return 0
+        power = self.power
+        return math.sqrt(max(0.0, power[end] - power[start]) / frames)
+    
+    @property
+    def stats(self):
+        """ Stats of the windows, with blocks of half a second. """
+        if self._stats is None:
+            stats = Stats(self.windows(0.5), self.window_frames)
+            for i, rms in enumerate(self.rms):
+                stats.add(rms, self.position(i + 1) - self.position(i))
+            self._stats = stats
+        return self._stats
+    
+    @property
+    def max_amplitude(self):
+        """ Maximal amplitude in file. This is only an approximation. """
+        if self._max_amplitude is None:
+            self._max_amplitude = self.stats.max_amplitude
+        return self._max_amplitude
+    
+    @property
+    def min_amplitude(self):
+        """ Minimum amplitude in file. This is only an approximation. """
+        if self._min_amplitude is None:
+            self._min_amplitude = self.stats.min_amplitude
+        return self._min_amplitude
+    
+    def median_volume(self):
+        """ Median volume for the whole file. """
+        return self.stats.volume
+    
+    def get_silence(self, pause_seconds=2, silence_cap=500, parent_thread=None):
+        """ Equivalent of Audio.get_silence working on the envelope. Once a
+        pause has been found, it is extended window by window instead of
+        in steps of 20 frames. """
+        return self.silence(
+            self.scan(pause_seconds, silence_cap, 0, parent_thread)
+        )
+    
+    def scan(self, pause_seconds, silence_cap, start=0, parent_thread=None):
+        """ Yield the steps of the silence detection beginning at window 
+        start as (i, j, silent). A step covered the windows i to j and 
+        silent tells whether they were found to be a pause. """
+        if parent_thread is None:
+            parent_thread = DummyThread()
+        block = self.windows(pause_seconds)
+        rms = self.rms
+        n = len(rms)
+        i = start
+        while i < n:
+            if parent_thread.is_stopped():
+                raise Cancelled
+            j = min(i + block, n)
+            silent = self.block_rms(i, j) < silence_cap
+            if silent:
+                # Continue window by window until a window is not silent
+                # anymore. Like Audio.get_silence, the first loud window is
+                # included in the pause.
+                while j < n:
+                    j += 1
+                    if rms[j - 1] >= silence_cap:
+                        break
+            yield i, j, silent
+            i = j
+    
+    def silence(self, steps):
+        """ Turn the steps yielded by scan into the [start, end] frame ranges
+        returned by get_silence. """
+        silence = []
+        for i, j, silent in steps:
+            if not silent:
+                continue
+            start = self.position(i)
+            # If the last sequent of silence ends where the new one starts
+            # it's a continous range.
+            if silence and silence[-1][1] == start:
+                silence[-1][1] = self.position(j)
+            else:
+                silence.append([start, self.position(j)])
+        return silence
+    
+    def tracks(self, silence, min_length):
+        return find_tracks(silence, min_length, self.framerate)
+    
+    def runs(self, silence_cap, pause_seconds=2):
+        """ Return the runs of windows quieter than silence_cap that are at 
+        least pause_seconds long, in the format of get_silence. """
+        block = self.windows(pause_seconds)
+        silence = []
+        start = None
+        for i, rms in enumerate(self.rms):
+            if rms < silence_cap:
+                if start is None:
+                    start = i
+            else:
+                if start is not None and i - start >= block:
+                    silence.append([self.position(start), self.position(i)])
+                start = None
+        if start is not None and len(self.rms) - start >= block:
+            silence.append([self.position(start), self.frames])
+        return silence
+    
+    def thresholds(self, min_length, pause_seconds, parent_thread=None):
+        """ Return the findsilence.solver.Thresholds telling how many tracks
+        every volume cap yields with runs. """
+        from findsilence import solver
+        return solver.solve(self, min_length, pause_seconds, parent_thread)
+    
+    def split_into(self, tracks, min_length, pause_seconds, parent_thread=None):
+        """ Return the silence that splits the file into tracks tracks.
+        
+        The pauses are the ones get_silence finds. thresholds suggests a 
+        volume cap first; it counts runs of silent windows, so a click in a
+        pause can make it wrong. If the pauses for that cap do not give 
+        tracks tracks, the cap is bisected over the levels instead. If no 
+        cap tried gives exactly tracks tracks, a TrackCountWarning is issued
+        and the silence giving the closest amount of tracks is returned. """
+        if parent_thread is None:
+            parent_thread = DummyThread()
+        notifier = get_notifier(parent_thread)
+        notifier.phase_start('solve')
+        thresholds = self.thresholds(min_length, pause_seconds, parent_thread)
+        notifier.count('volume_levels', len(thresholds.caps))
+        # Amount of tracks and silence for every cap tried.
+        attempts = {}
+        
+        def attempt(silence_cap):
+            if silence_cap not in attempts:
+                silence = self.get_silence(pause_seconds, silence_cap, 
+                                           parent_thread)
+                attempts[silence_cap] = (
+                    len(list(self.tracks(silence, min_length))), silence
+                )
+            return attempts[silence_cap][0]
+        
+        silence_cap = thresholds.cap(tracks)
+        if silence_cap is None or attempt(silence_cap) != tracks:
+            silence_cap = self._bisect(tracks, attempt)
+        notifier.phase_end('solve', self.frames)
+        if silence_cap is None:
+            counts = [n for n, silence in attempts.itervalues()]
+            smaller = max([n for n in counts if n < tracks] or [None])
+            larger = min([n for n in counts if n > tracks] or [None])
+            warnings.warn(TrackCountWarning(tracks, smaller, larger), 
+                          stacklevel=2)
+            if smaller is None or \
+               larger is not None and larger - tracks < tracks - smaller:
+                closest = larger
+            else:
+                closest = smaller
+            if closest is None:
+                return []
+            silence_cap = min(cap for cap, (n, silence) in 
+                              attempts.iteritems() if n == closest)
+        return attempts[silence_cap][1]
+    
+    def _bisect(self, tracks, attempt):
+        """ Bisect over the levels for a volume cap for which attempt 
+        returns tracks. Return None if none is found.
+        
+        The amount of tracks grows with the cap only until the pauses begin
+        to swallow the tracks, so the caps of a coarse grid are tried first,
+        from the lowest one, and the search bisects between the last cap 
+        giving too few tracks and the first one giving too many. """
+        levels = self.levels
+        if not levels:
+            return None
+        
+        def cap(index):
+            # With a cap of levels[index] the index quietest levels are 
+            # silent.
+            if index < len(levels):
+                return levels[index]
+            return levels[-1] + 1
+        
+        # Volume is perceived logarithmically.
+        low, high = max(levels[0], 1), levels[-1] + 1
+        grid = sorted(set(
+            min(bisect.bisect_left(levels, low * (high / low) ** 
+                                   (k / float(self.grid_caps))), 
+                len(levels))
+            for k in xrange(self.grid_caps + 1)
+        ) | set([0, len(levels)]))
+        lo = 0
+        for index in grid:
+            n = attempt(cap(index))
+            if n == tracks:
+                return cap(index)
+            elif n > tracks:
+                break
+            lo = index + 1
+        else:
+            return None
+        hi = index - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            n = attempt(cap(mid))
+            if n == tracks:
+                return cap(mid)
+            elif n > tracks:
+                # We split too often. Need to consider less as silence.
+                hi = mid - 1
+            else:
+                # We split too seldom. Need to consider more as silence.
+                lo = mid + 1
+        return None
+
+
 class Audio:
     """ This class implements the silence finding. File-type specific mechanics
     have to be overridden by child classes representing the file-types."""
+    _envelope = None
+    _stats = None
+    # rms may return less than the true root-mean-square by up to this much,
+    # as audioop.rms rounds down to whole numbers.
+    rms_resolution = 1
+    
     def __init__(self):
         pass
     
@@ -120,29 +587,116 @@ class Audio:
     @property
     def max_amplitude(self):
         """ Maximal amplitude in file """
-        raise NotImplementedError
+        return self.stats().max_amplitude
     
     @property
     def min_amplitude(self):
         """ Minimum amplitude in file """
-        raise NotImplementedError
+        return self.stats().min_amplitude
     
     def median_volume(self):
-        """ Median volume for the whole file. 
+        """ Median volume for the whole file. """
+        return self.stats().volume
+    
+    def stats(self, window_seconds=defaults.window_seconds, 
+              parent_thread=None, engine=defaults.engine):
+        """ Return the Stats of the file. They are taken from the envelope if
+        it has been computed, otherwise they are gathered in one pass that 
+        only holds a few windows at a time, and cached.
+        
+        It returns to the position where the file was before. """
+        if self._envelope is not None:
+            return self._envelope.stats
+        window_frames = max(1, int(window_seconds * self.framerate))
+        if self._stats is not None and \
+           self._stats.window_frames == window_frames:
+            return self._stats
+        # An empty Envelope tells how many windows make up a block.
+        block_windows = Envelope(self.frames, self.framerate, 
+                                 window_frames).windows(0.5)
+        stats = Stats(block_windows, window_frames)
+        if parent_thread is None:
+            parent_thread = DummyThread()
+        notifier = get_notifier(parent_thread)
+        notifier.phase_start('amplitude')
+        chunk = max(1, defaults.buffer_frames // window_frames)
+        start = 0
+        while start * window_frames < self.frames:
+            for rms in self.window_rms(window_frames, start, start + chunk, 
+                                       parent_thread, engine):
+                end = min((start + 1) * window_frames, self.frames)
+                stats.add(rms, end - start * window_frames)
+                start += 1
+        notifier.phase_end('amplitude', self.frames)
+        notifier.count('bytes_read', self.frames * self.channels * self.width)
+        self._stats = stats
+        return stats
+    
+    def envelope(self, window_seconds=defaults.window_seconds, 
+                 parent_thread=None, engine=defaults.engine):
+        """ Return the loudness Envelope of the file. It is computed in one 
+        pass the first time it is needed and cached afterwards.
+        
+        It returns to the position where the file was before. """
+        window_frames = max(1, int(window_seconds * self.framerate))
+        if self._envelope is not None and \
+           self._envelope.window_frames == window_frames:
+            return self._envelope
+        envelope = Envelope(
+            self.frames, self.framerate, window_frames,
+            self.window_rms(window_frames, 0, None, parent_thread, engine)
+        )
+        self._envelope = envelope
+        return envelope
+    
+    def window_rms(self, window_frames, start=0, stop=None, parent_thread=None,
+                   engine=defaults.engine):
+        """ Return the root-mean-square of the windows of window_frames frames
+        from window start up to window stop, or the end of the file, as an 
+        array of doubles. 
         
-        It returns to the position where
-        the file was before after telling the median volume."""
+        It returns to the position where the file was before. """
+        if parent_thread is None:
+            parent_thread = DummyThread()
+        end = self.frames
+        if stop is not None:
+            end = min(stop * window_frames, end)
+        rms = array.array('d')
+        module = get_engine(engine)
+        if module is not None:
+            rms.fromstring(
+                module.envelope_rms(self, window_frames, parent_thread, 
+                                    start, stop).tostring()
+            )
+            return rms
+        last_emitted = None
+        append = rms.append
         pos = self.tell()
-        self.rewind()
-        median_volume = self.rms(self.readframes(self.frames))
+        i = start * window_frames
+        self.setpos(i)
+        while i < end:
+            if parent_thread.is_stopped():
+                self.setpos(pos)
+                raise Cancelled
+            append(self.rms(self.readframes(min(window_frames, end - i))))
+            i = self.tell()
+            if last_emitted is None or last_emitted + self.frames / 100 < i:
+                last_emitted = i
+                parent_thread.notifier.current_frame(i)
         self.setpos(pos)
-        return median_volume
+        return rms
     
-    def get_silence(self, pause_seconds=2, silence_cap=500, parent_thread=None):
+    def get_silence(self, pause_seconds=2, silence_cap=500, parent_thread=None,
+                    engine=defaults.engine):
         """ 
         pause_seconds is either an int or a float containing the minimum length 
         of a pause. Silence cap defines what volume level is considered silence.
+        engine is one of ENGINES.
         """
+        module = get_engine(engine)
+        if module is not None:
+            return module.get_silence(self, pause_seconds, silence_cap, 
+                                      parent_thread)
         last_emitted = None
         # Enable function to run without a parent Thread.
         if parent_thread is None:
@@ -187,50 +741,92 @@ class Audio:
         return silence
     
     def tracks(self, silence, min_length):
-        from_pos = 0
-        for to_pos, next_from in silence:
-            if (to_pos - from_pos) >= min_length * self.framerate:
-                # Track is long enough to be considered a track.
-                yield from_pos, to_pos
-            from_pos = next_from
+        return find_tracks(silence, min_length, self.framerate)
     
     def track_data(self, tracks):
         for from_pos, to_pos in tracks:
             self.setpos(from_pos)
             yield self.readframes(to_pos - from_pos)
+    
+    def write_track(self, file_name, from_pos, to_pos, 
+                    buffer_frames=defaults.buffer_frames):
+        """ Write the frames from from_pos to to_pos into file_name. Override
+        this to copy at most buffer_frames frames at once; this default 
+        implementation reads the whole track. """
+        self.setpos(from_pos)
+        self.write_frames(file_name, self.readframes(to_pos - from_pos))
 
     def split_into(self, tracks, min_length, pause_seconds, parent_thread):
-        min_ = self.min_amplitude
-        max_ = self.max_amplitude
-        while True:
-            mid = min_ + (max_ - min_) / 2.0
-            
-            silence = self.get_silence(
-                pause_seconds, mid, parent_thread
-            )
-            n = len(list(self.tracks(silence, min_length)))
-            
-            if n == tracks or min_ == max_:
-                # Either we're done or we would never be done anyway.
-                break
-            elif n > tracks:
-                # We split too often. Need to consider less as silence.
-                max_ = mid
-            else:
-                # We split too seldom. Need to consider more as silence.
-                min_ = mid
-    
-        return silence
+        envelope = self.envelope(parent_thread=parent_thread)
+        return envelope.split_into(tracks, min_length, pause_seconds, 
+                                   parent_thread)
 
     @classmethod
-    def from_file(cls, filename):
-        if filename.lower().endswith('.wav'):
-            return Wave(filename)
+    def from_file(cls, filename, mapped=True):
+        """ Open filename with the class for its file-type. Local wave files 
+        are memory-mapped unless mapped is False. """
+        if os.path.splitext(filename)[1].lower() in WAVE_EXTENSIONS:
+            if mapped and os.path.isfile(filename):
+                try:
+                    return MappedWave(filename)
+                except (wave.Error, EnvironmentError, ValueError):
+                    # Let wave.Wave_read have a go at it.
+                    pass
+            try:
+                return Wave(filename)
+            except wave.Error:
+                # RF64, BW64 and Wave64 files.
+                return StreamedWave(filename)
         else:
             raise ValueError
 
 
-class Wave(wave.Wave_read, Audio):
+class PCMAudio(Audio):
+    """ Base class for file-types storing uncompressed PCM described by the 
+    width, channels and framerate attributes. Output is written as 
+    wave files, or as RF64 files if it does not fit into a wave file. 
+    container is the one of the input, one of findsilence.wave64.CONTAINERS.
+    """
+    container = 'wave'
+    
+    def open_writer(self, file_name, nframes):
+        """ Open file_name for writing nframes frames of this file-type. """
+        return wave64.open_writer(file_name, self.channels, self.width,
+                                  self.framerate, nframes, self.container)
+    
+    def write_frames(self, file_name, frames):
+        """ Write the frames into file_name with the same header as the 
+        original file had """
+        f = self.open_writer(file_name, 
+                             len(frames) // (self.channels * self.width))
+        try:
+            f.writeframes(frames)
+        finally:
+            f.close()
+    
+    def write_track(self, file_name, from_pos, to_pos, 
+                    buffer_frames=defaults.buffer_frames):
+        """ Write the frames from from_pos to to_pos into file_name, copying
+        buffer_frames frames at a time. """
+        f = self.open_writer(file_name, to_pos - from_pos)
+        try:
+            self.setpos(from_pos)
+            pos = from_pos
+            while pos < to_pos:
+                frames = self.readframes(min(buffer_frames, to_pos - pos))
+                if not frames:
+                    break
+                f.writeframes(frames)
+                pos = self.tell()
+        finally:
+            f.close()
+    
+    def rms(self, frames):
+        """ Get root-mean-square of frames in the wave file """
+        return audioop.rms(frames, self.width)
+
+
+class Wave(wave.Wave_read, PCMAudio):
     """ This class implements the Wave file-type so it is suiteable for use 
     with Audio. It takes most of its methods from wave.Wave_read. """
     def __init__(self, file_name):
@@ -239,67 +835,353 @@ class Wave(wave.Wave_read, Audio):
         self.frames = self.getnframes()
         self.channels = self.getnchannels()
         self.framerate = self.getframerate()
-        
-        self._max_amplitude = None
-        self._min_amplitude = None
+
+
+def _libc_function(name, *argtypes):
+    """ Return the function name of the C library with the given argument
+    types, or None if there is no such function. Only used on Linux, where
+    the signatures are known. """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes
+        function = getattr(ctypes.CDLL(None, use_errno=True), name)
+    except (ImportError, OSError, AttributeError):
+        return None
+    function.argtypes = argtypes
+    function.restype = ctypes.c_ssize_t
+    return function
+
+
+def _check_errno(result):
+    """ Raise the OSError of a failed C library call. """
+    if result < 0:
+        import ctypes
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+    return result
+
+
+def _kernel_copies():
+    """ Return the functions copying bytes between file descriptors in the 
+    kernel, best first, as f(src, offset, dst, count) returning the amount 
+    copied. Python 2 has neither os.copy_file_range nor os.sendfile, so 
+    they are called through ctypes there. """
+    copies = []
+    if hasattr(os, 'copy_file_range'):
+        copies.append(lambda src, offset, dst, count: 
+                      os.copy_file_range(src, dst, count, offset))
+    else:
+        import ctypes
+        function = _libc_function(
+            'copy_file_range', ctypes.c_int, ctypes.POINTER(ctypes.c_int64),
+            ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint
+        )
+        if function is not None:
+            copies.append(lambda src, offset, dst, count, f=function: 
+                          _check_errno(f(src, 
+                                         ctypes.byref(ctypes.c_int64(offset)),
+                                         dst, None, count, 0)))
+    if hasattr(os, 'sendfile'):
+        copies.append(lambda src, offset, dst, count: 
+                      os.sendfile(dst, src, offset, count))
+    else:
+        import ctypes
+        function = _libc_function(
+            'sendfile64', ctypes.c_int, ctypes.c_int, 
+            ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t
+        )
+        if function is not None:
+            copies.append(lambda src, offset, dst, count, f=function: 
+                          _check_errno(f(dst, src,
+                                         ctypes.byref(ctypes.c_int64(offset)),
+                                         count)))
+    return copies
+
+
+# Filled by copy_range on first use.
+_copies = None
+
+
+def copy_range(src, offset, dst, count):
+    """ Copy count bytes from offset in the file descriptor src to the 
+    current position of the file descriptor dst without passing them 
+    through Python. copy_file_range, which lets the filesystem share the 
+    blocks where it can, is tried first, then sendfile. Return the amount 
+    of bytes copied, which is less than count if the kernel cannot copy 
+    between these files; the caller copies the rest. """
+    global _copies
+    if _copies is None:
+        _copies = _kernel_copies()
+    copied = 0
+    for function in _copies:
+        while copied < count:
+            try:
+                n = function(src, offset + copied, dst, count - copied)
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EXDEV,
+                                   errno.ENOTSOCK, errno.EOPNOTSUPP):
+                    raise
+                # Not supported for these files.
+                break
+            if not n:
+                break
+            copied += n
+    return copied
+
+
+class StreamedWave(PCMAudio):
+    """ Wave file-type reading the samples with seek and read, for files 
+    wave.Wave_read cannot open, such as RF64, BW64 and Wave64 files or 
+    files larger than 4 GB, when they cannot be mapped into memory. """
+    def __init__(self, file_name):
+        self._file = open(file_name, 'rb')
+        try:
+            self.container, fmt, self._offset, size = wave64.read_header(
+                self._file
+            )
+            self.channels, self.framerate, self.width = fmt
+            self._open()
+        except:
+            self._file.close()
+            raise
+        self._framesize = self.channels * self.width
+        self.frames = self._frames(size)
+        self._pos = 0
     
-    def write_frames(self, file_name, frames):
-        """ Write the frames into file_name with the same header as the 
-        original file had """
-        f = wave.open(file_name, 'wb')
-        f.setnchannels(self.channels)
-        f.setsampwidth(self.width)
-        f.setframerate(self.framerate)
+    def _open(self):
+        pass
+    
+    def _frames(self, size):
+        """ Amount of frames in a data chunk of size bytes. Recorders write
+        0 or 0xFFFFFFFF until they know the size; then the chunk is taken 
+        to go on to the end of the file. """
+        length = self._length() - self._offset
+        if size in (0, 0xFFFFFFFF):
+            size = length
+        # Do not trust the header further than the file goes.
+        return min(size, length) // self._framesize
+    
+    def refresh(self):
+        """ Read the header again and return the amount of frames, which 
+        grows while the file is being recorded. """
+        self._file.seek(0)
+        container, fmt, self._offset, size = wave64.read_header(self._file)
+        self.frames = self._frames(size)
+        return self.frames
+    
+    def _length(self):
+        return os.fstat(self._file.fileno()).st_size
+    
+    def tell(self):
+        return self._pos
+    
+    def setpos(self, pos):
+        if pos < 0 or pos > self.frames:
+            raise wave.Error('position not in range')
+        self._pos = pos
+    
+    def rewind(self):
+        self._pos = 0
+    
+    def readframes(self, x):
+        x = max(0, min(x, self.frames - self._pos))
+        self._file.seek(self._offset + self._pos * self._framesize)
+        data = self._file.read(x * self._framesize)
+        self._pos += len(data) // self._framesize
+        return data
+    
+    def write_track(self, file_name, from_pos, to_pos, 
+                    buffer_frames=defaults.buffer_frames):
+        """ Write the frames from from_pos to to_pos into file_name. Only 
+        the header is written from Python, the samples are copied from the
+        data chunk of this file by copy_range, or by copy_data where the 
+        kernel cannot copy them. """
+        to_pos = min(to_pos, self.frames)
+        nframes = max(0, to_pos - from_pos)
+        size = nframes * self._framesize
+        offset = self._offset + from_pos * self._framesize
+        f = open(file_name, 'wb')
         try:
-            f.writeframes(frames)
+            f.write(wave64.header(self.channels, self.width, self.framerate,
+                                  nframes, self.container))
+            f.flush()
+            fd = f.fileno()
+            copied = copy_range(self._file.fileno(), offset, fd, size)
+            self.copy_data(offset + copied, fd, size - copied,
+                           buffer_frames * self._framesize)
+            if size % 2:
+                # Chunks are word-aligned.
+                os.write(fd, b'\0')
         finally:
             f.close()
+        self._pos = from_pos + nframes
     
-    def rms(self, frames):
-        """ Get root-mean-square of frames in the wave file """
-        return audioop.rms(frames, self.width)
+    def copy_data(self, offset, fd, size, buffer_size):
+        """ Write size bytes from offset in this file to the file 
+        descriptor fd, buffer_size bytes at a time. """
+        src = self._file.fileno()
+        while size > 0:
+            os.lseek(src, offset, os.SEEK_SET)
+            data = os.read(src, min(size, buffer_size))
+            if not data:
+                break
+            offset += len(data)
+            size -= len(data)
+            while data:
+                data = data[os.write(fd, data):]
     
-    @property
-    def max_amplitude(self):
-        # This is only an approximation.
-        if self._max_amplitude is not None:
-            return self._max_amplitude
-        
-        pos = self.tell()
-        self.rewind()
-        
-        max_ = 0
-        read_frames = int(0.5 * self.framerate)
-        frame = 0
-        while self.tell() < self.frames:
-            frames = self.readframes(read_frames)
-            rms = self.rms(frames)
-            if rms > max_:
-                max_ = rms
-        self.setpos(pos)
-        self._max_amplitude = max_
-        return max_
+    def close(self):
+        self._file.close()
+
+
+class MappedWave(StreamedWave):
+    """ Wave file-type that maps the file into memory. readframes returns
+    views into the mapping, so neither analysis nor writing copies the 
+    samples. """
+    def _open(self):
+        self._map = mmap.mmap(self._file.fileno(), 0, 
+                              access=mmap.ACCESS_READ)
     
-    @property
-    def min_amplitude(self):
-        # This is only an approximation.
-        if self._min_amplitude is not None:
-            return self._min_amplitude
-        
+    def refresh(self):
+        # The mapping does not grow along with the file.
+        self._map.close()
+        self._open()
+        return StreamedWave.refresh(self)
+    
+    def _length(self):
+        return len(self._map)
+    
+    def readframes(self, x):
+        x = max(0, min(x, self.frames - self._pos))
+        data = _view(self._map, self._offset + self._pos * self._framesize,
+                     x * self._framesize)
+        self._pos += x
+        return data
+    
+    def copy_data(self, offset, fd, size, buffer_size):
+        # Writing views of the mapping copies nothing in Python.
+        end = min(offset + size, len(self._map))
+        while offset < end:
+            offset += os.write(fd, _view(self._map, offset, 
+                                         min(end - offset, buffer_size)))
+    
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def downmix(data, width, channels):
+    """ Return the frames of channels channels in data as one channel, the
+    average of them all. """
+    samples = array.array({1: 'b', 2: 'h', 4: 'i'}[width])
+    samples.fromstring(bytes(data))
+    mono = None
+    for channel in xrange(channels):
+        channel = audioop.mul(samples[channel::channels].tostring(), width,
+                              1.0 / channels)
+        if mono is None:
+            mono = channel
+        else:
+            mono = audioop.add(mono, channel, width)
+    return mono
+
+
+class Proxy(Audio):
+    """ Mono, decimated and at most 16 bit version of a PCMAudio, created 
+    while reading, for cheaper analysis. Only every factor-th frame of the 
+    original is used, so frame pos of the proxy is frame pos * factor of the
+    original. Volumes are scaled back to the sample width of the original,
+    so volume caps keep their meaning. """
+    def __init__(self, audio, analysis_rate=8000):
+        self.audio = audio
+        self.factor = max(1, audio.framerate // analysis_rate)
+        self.framerate = audio.framerate / float(self.factor)
+        self.frames = -(-audio.frames // self.factor)
+        self.channels = 1
+        self.width = min(audio.width, 2)
+        # Factor from volumes of the proxy to ones of the original.
+        self.scale = 256 ** (audio.width - self.width)
+        self.rms_resolution = self.scale
+    
+    def tell(self):
+        return -(-self.audio.tell() // self.factor)
+    
+    def setpos(self, pos):
+        self.audio.setpos(self.source_position(pos))
+    
+    def rewind(self):
+        self.audio.rewind()
+    
+    def readframes(self, x):
+        audio = self.audio
+        # A view into the mapped file for a MappedWave, so the slices below
+        # only touch the bytes they keep.
+        data = audio.readframes(x * self.factor)
+        width, channels = audio.width, audio.channels
+        step = width * channels * self.factor
+        frames = -(-len(data) // step)
+        # Keep every factor-th frame and of every sample only its upper 
+        # self.width bytes, which converts it like audioop.lin2lin.
+        samples = bytearray(frames * channels * self.width)
+        size = channels * self.width
+        for channel in xrange(channels):
+            for k in xrange(self.width):
+                offset = channel * width + width - self.width + k
+                samples[channel * self.width + k::size] = data[offset::step]
+        if channels == 2:
+            return audioop.tomono(bytes(samples), self.width, 0.5, 0.5)
+        elif channels > 2:
+            return downmix(samples, self.width, channels)
+        return bytes(samples)
+    
+    def window_rms(self, window_frames, start=0, stop=None, parent_thread=None,
+                   engine=defaults.engine):
+        """ Audio.window_rms reading many windows at once, so that the 
+        original is decimated in large blocks. """
+        if get_engine(engine) is not None:
+            # The engine reads large blocks anyway.
+            return Audio.window_rms(self, window_frames, start, stop, 
+                                    parent_thread, engine)
+        if parent_thread is None:
+            parent_thread = DummyThread()
+        end = self.frames
+        if stop is not None:
+            end = min(stop * window_frames, end)
+        read_frames = max(1, defaults.buffer_frames // window_frames) * \
+                      window_frames
+        size = window_frames * self.width
+        rms = array.array('d')
+        append = rms.append
         pos = self.tell()
-        self.rewind()
-        
-        min_ = None
-        read_frames = int(0.5 * self.framerate)
-        frame = 0
-        while self.tell() < self.frames:
-            frames = self.readframes(read_frames)
-            rms = self.rms(frames)
-            if min_ is None or rms < min_:
-                min_ = rms
+        i = start * window_frames
+        self.setpos(i)
+        while i < end:
+            if parent_thread.is_stopped():
+                self.setpos(pos)
+                raise Cancelled
+            data = self.readframes(min(read_frames, end - i))
+            if not data:
+                break
+            for offset in xrange(0, len(data), size):
+                append(self.rms(data[offset:offset + size]))
+            i += len(data) // self.width
+            parent_thread.notifier.current_frame(i)
         self.setpos(pos)
-        self._min_amplitude = min_
-        return min_
+        return rms
+    
+    def rms(self, frames):
+        return audioop.rms(frames, self.width) * self.scale
+    
+    def source_position(self, pos):
+        """ Frame of the original file corresponding to frame pos. """
+        return min(pos * self.factor, self.audio.frames)
+    
+    def map_silence(self, silence):
+        """ Translate silence found in the proxy into frames of the original
+        file. """
+        return [[self.source_position(start), self.source_position(end)]
+                for start, end in silence]
 
 
 class MP3(Audio):
@@ -316,42 +1198,145 @@ class Ogg(Audio):
     pass
 
 
-def split_phono(file_name, directory, pause_seconds=2, volume_cap=300, 
-                min_length=10, parent_thread=None, tracks=None):
-    """ Only change pause_seconds or volume_cap if you are sure what you are 
-    doing! They seem to be working pretty good for old records. """
+def analyse(file_name, pause_seconds=2, volume_cap=300, min_length=10, 
+            parent_thread=None, tracks=None, engine=defaults.engine, jobs=1, 
+            cache=None, coarse_to_fine=False, analysis_rate=None):
+    """ Find the silence in file_name without writing anything. Takes the
+    same arguments as split_phono. Return the Audio object of the file and
+    the silence; Audio.tracks turns the latter into the split points. """
     if parent_thread is None:
         parent_thread = DummyThread()
-    if not os.path.exists(directory):
-        os.mkdir(directory)
-    elif os.path.isfile(directory):
-        raise FileExists("The directory you supplied is a file.")
-    audio = Audio.from_file(file_name)
+    audio = analysed = Audio.from_file(file_name)
+    if analysis_rate:
+        analysed = Proxy(audio, analysis_rate)
+        # The worker processes would analyse the original file.
+        jobs = 1
+    notifier = get_notifier(parent_thread)
     # Callback used to initalize progressbar.
-    parent_thread.notifier.total_frames(audio.frames)
+    notifier.total_frames(analysed.frames)
     
-    if tracks is not None:
-        silence = audio.split_into(tracks, min_length, pause_seconds, parent_thread)
+    envelope = silence = None
+    if coarse_to_fine and tracks is None:
+        from findsilence import pyramid
+        notifier.phase_start('pyramid')
+        silence = pyramid.get_silence(analysed, pause_seconds, volume_cap, 
+                                      parent_thread)
+        notifier.phase_end('pyramid', analysed.frames)
     else:
-        silence = audio.get_silence(pause_seconds, volume_cap, parent_thread)
+        # Read the file once. Everything below works on the envelope.
+        if cache is not None:
+            envelope = cache.load(file_name, analysis_rate=analysis_rate)
+            if envelope is None:
+                notifier.count('cache_misses')
+            else:
+                notifier.count('cache_hits')
+        if envelope is None:
+            notifier.phase_start('envelope')
+            if jobs > 1:
+                from findsilence import parallel
+                if tracks is None:
+                    envelope, silence = parallel.get_silence(
+                        file_name, jobs, pause_seconds, volume_cap, 
+                        engine=engine, parent_thread=parent_thread
+                    )
+                else:
+                    envelope = parallel.envelope(
+                        file_name, jobs, engine=engine, 
+                        parent_thread=parent_thread
+                    )
+            else:
+                envelope = analysed.envelope(parent_thread=parent_thread, 
+                                             engine=engine)
+            notifier.phase_end('envelope', analysed.frames)
+            notifier.count('bytes_read', audio.frames * audio.channels * 
+                           audio.width)
+            if cache is not None:
+                cache.store(file_name, envelope, analysis_rate=analysis_rate)
+        analysed._envelope = envelope
+        
+        if tracks is not None:
+            silence = analysed.split_into(tracks, min_length, pause_seconds, 
+                                          parent_thread)
+        elif silence is None:
+            notifier.phase_start('scan')
+            silence = envelope.get_silence(pause_seconds, volume_cap, 
+                                           parent_thread)
+            notifier.phase_end('scan', envelope.frames)
     
     if not silence:
         raise NoSilence
+    if analysed is not audio:
+        silence = analysed.map_silence(silence)
+    return audio, silence
+
+
+def split_phono(file_name, directory, pause_seconds=2, volume_cap=300, 
+                min_length=10, parent_thread=None, tracks=None, 
+                engine=defaults.engine, buffer_frames=defaults.buffer_frames,
+                jobs=1, cache=None, pipeline=False, coarse_to_fine=False,
+                analysis_rate=None, follow=False, 
+                idle_seconds=defaults.idle_seconds):
+    """ Only change pause_seconds or volume_cap if you are sure what you are 
+    doing! They seem to be working pretty good for old records. 
+    
+    If jobs is larger than one, the file is analysed in that many 
+    processes. cache is a findsilence.cache.Cache the envelope is taken 
+    from, or stored in if it is not there yet. If pipeline is True, tracks
+    are written by a separate thread while the analysis goes on; like 
+    follow, it cannot be combined with tracks, jobs, cache, coarse_to_fine
+    or analysis_rate, nor with follow. If coarse_to_fine is
+    True and tracks is not used, the silence is searched with 
+    findsilence.pyramid instead of the envelope. If analysis_rate is given,
+    a Proxy of the file with about that framerate is analysed instead of
+    the file itself. If follow is True, the file is split by 
+    findsilence.follow while it is still being recorded, until it has not
+    grown for idle_seconds; it cannot be combined with tracks, jobs, 
+    cache, coarse_to_fine or analysis_rate and raises ValueError then.
+    
+    Return the amount of tracks written. """
+    simple = tracks is None and jobs < 2 and cache is None and \
+             not coarse_to_fine and not analysis_rate
+    if follow and not simple:
+        raise ValueError("follow cannot be combined with tracks, jobs, "
+                         "cache, coarse_to_fine or analysis_rate")
+    if pipeline and (follow or not simple):
+        raise ValueError("pipeline cannot be combined with tracks, jobs, "
+                         "cache, coarse_to_fine, analysis_rate or follow")
+    if parent_thread is None:
+        parent_thread = DummyThread()
+    if not os.path.exists(directory):
+        os.mkdir(directory)
+    elif os.path.isfile(directory):
+        raise FileExists("The directory you supplied is a file.")
+    if follow:
+        from findsilence import follow
+        return follow.split_phono(file_name, directory, pause_seconds, 
+                                  volume_cap, min_length, parent_thread, 
+                                  engine, buffer_frames, 
+                                  idle_seconds=idle_seconds)
+    if pipeline:
+        from findsilence import pipeline
+        return pipeline.split_phono(file_name, directory, pause_seconds, 
+                                    volume_cap, min_length, parent_thread, 
+                                    engine, buffer_frames)
+    audio, silence = analyse(file_name, pause_seconds, volume_cap, min_length,
+                             parent_thread, tracks, engine, jobs, cache,
+                             coarse_to_fine, analysis_rate)
     
-    split_tracks = audio.track_data(audio.tracks(silence, min_length))
-    
-    minus = 0
-    for i, split_track in enumerate(split_tracks):
-        if len(split_track) / (audio.channels * audio.width) \
-           < min_length * audio.framerate:
-            # Prevent track numbers to be left out because of too short
-            # tracks in order to ensure consistency.
-            minus += 1
-            # Skip tracks shorter than min_length seconds.
-            # As on old records that could be the pick-up.
-            continue
-        f_name = os.path.join(directory, "track_%.2d.wav" % (i - minus))
-        audio.write_frames(f_name, split_track)
+    # Audio.tracks already skips tracks shorter than min_length seconds, 
+    # as on old records that could be the pick-up, so no audio needs to be
+    # read to decide which tracks to write. Track numbers stay consecutive.
+    notifier = get_notifier(parent_thread)
+    written = 0
+    for i, (from_pos, to_pos) in enumerate(audio.tracks(silence, min_length)):
+        f_name = os.path.join(directory, "track_%.2d.wav" % i)
+        notifier.phase_start('write')
+        audio.write_track(f_name, from_pos, to_pos, buffer_frames)
+        notifier.phase_end('write', to_pos - from_pos)
+        notifier.count('bytes_written', (to_pos - from_pos) * 
+                       audio.channels * audio.width)
+        written += 1
     # Callback to allow UI to do cleanup actions without needing to worry
     # about the state of the worker Thread.
     parent_thread.notifier.done()
+    return written
@@ -0,0 +1,234 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Analyse many files and keep the results small.
+
+A list of [start, end] lists per file costs a few hundred bytes per pause.
+Segments holds the pauses of a file as two arrays of 64 bit frame numbers
+instead, next to the framerate and loudness statistics of the file, and
+turns into a flat string and back without going through pickle. analyse
+yields one for every file of an iterable, optionally analysing them in
+worker processes. """
+
+import array
+import itertools
+import multiprocessing
+import struct
+import sys
+
+import findsilence
+from findsilence import defaults
+
+
+def _frames_typecode():
+    """ Return the typecode of arrays of unsigned 64 bit integers. """
+    for typecode in ('L', 'Q'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    raise ImportError("no array typecode for 64 bit integers")
+
+FRAMES = _frames_typecode()
+MAGIC = b'FSSEG001'
+# Magic, length of the file name, length of the error, framerate, frames,
+# pauses, min_amplitude, max_amplitude, median volume. The file name, the
+# error and the starts and ends of the pauses follow, all little-endian.
+HEADER = struct.Struct('<8sIIdQQQQd')
+
+
+class Segments(object):
+    """ The pauses found in file_name as frame numbers in the arrays starts
+    and ends, and statistics of the file. If it could not be analysed, error
+    is the reason and there are no pauses. """
+    __slots__ = ('file_name', 'framerate', 'frames', 'starts', 'ends',
+                 'min_amplitude', 'max_amplitude', 'volume', 'error')
+
+    def __init__(self, file_name, framerate=0, frames=0, silence=(),
+                 min_amplitude=0, max_amplitude=0, volume=0.0, error=None):
+        self.file_name = file_name
+        self.framerate = framerate
+        self.frames = frames
+        self.starts = array.array(FRAMES, [int(start)
+                                           for start, end in silence])
+        self.ends = array.array(FRAMES, [int(end) for start, end in silence])
+        self.min_amplitude = min_amplitude
+        self.max_amplitude = max_amplitude
+        self.volume = volume
+        self.error = error
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<Segments of %r: %s>' % (self.file_name, self.error)
+        return '<Segments of %r: %d pauses>' % (self.file_name, len(self))
+
+    def __reduce__(self):
+        # Used by the worker processes of analyse.
+        return loads, (self.tostring(), )
+
+    def silence(self):
+        """ Return the pauses in the format of findsilence.analyse. """
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
+
+    def tracks(self, min_length):
+        """ Yield the (from_pos, to_pos) ranges of the tracks, like
+        Audio.tracks. """
+        return findsilence.find_tracks(
+            itertools.izip(self.starts, self.ends), min_length, self.framerate
+        )
+
+    def tostring(self):
+        """ Return the record as a string that loads turns back into it. """
+        file_name = self.file_name
+        if not isinstance(file_name, bytes):
+            file_name = file_name.encode('utf-8')
+        error = (self.error or u'').encode('utf-8')
+        starts, ends = self.starts, self.ends
+        if sys.byteorder == 'big':
+            starts, ends = array.array(FRAMES, starts), array.array(FRAMES,
+                                                                    ends)
+            starts.byteswap()
+            ends.byteswap()
+        return b''.join([
+            HEADER.pack(MAGIC, len(file_name), len(error) if self.error
+                        is not None else 0xFFFFFFFF, self.framerate,
+                        self.frames, len(starts), self.min_amplitude,
+                        self.max_amplitude, self.volume),
+            file_name, error, starts.tostring(), ends.tostring()
+        ])
+
+
+def loads(data, offset=0):
+    """ Return the Segments stored at offset in data by Segments.tostring.
+    """
+    return _loads(data, offset)[0]
+
+
+def _loads(data, offset):
+    """ Return the Segments at offset in data and the offset after it. """
+    (magic, name_size, error_size, framerate, frames, pauses, min_amplitude,
+     max_amplitude, volume) = HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError("not a Segments record")
+    offset += HEADER.size
+    segments = Segments(data[offset:offset + name_size].decode('utf-8'),
+                        framerate, frames, (), min_amplitude, max_amplitude,
+                        volume)
+    offset += name_size
+    if error_size != 0xFFFFFFFF:
+        segments.error = data[offset:offset + error_size].decode('utf-8')
+        offset += error_size
+    size = pauses * segments.starts.itemsize
+    segments.starts.fromstring(data[offset:offset + size])
+    segments.ends.fromstring(data[offset + size:offset + 2 * size])
+    if len(segments.starts) != pauses or len(segments.ends) != pauses:
+        raise ValueError("Segments record is truncated")
+    if sys.byteorder == 'big':
+        segments.starts.byteswap()
+        segments.ends.byteswap()
+    return segments, offset + 2 * size
+
+
+def dump(records, f):
+    """ Write the Segments in records to the file object f. """
+    for segments in records:
+        f.write(segments.tostring())
+
+
+def load(f):
+    """ Yield the Segments written to the file object f by dump. """
+    data = f.read()
+    offset = 0
+    while offset < len(data):
+        segments, offset = _loads(data, offset)
+        yield segments
+
+
+def analyse_file(file_name, pause_seconds=2, volume_cap=300,
+                 parent_thread=None, engine=defaults.engine, cache=None,
+                 analysis_rate=None):
+    """ Return the Segments of file_name. The arguments are the ones of
+    findsilence.analyse. A file without silence gives Segments without
+    pauses; one that cannot be read gives Segments with the error. """
+    try:
+        audio = analysed = findsilence.Audio.from_file(file_name)
+        if analysis_rate:
+            analysed = findsilence.Proxy(audio, analysis_rate)
+        envelope = None
+        if cache is not None:
+            envelope = cache.load(file_name, analysis_rate=analysis_rate)
+        if envelope is None:
+            envelope = analysed.envelope(parent_thread=parent_thread,
+                                         engine=engine)
+            if cache is not None:
+                cache.store(file_name, envelope,
+                            analysis_rate=analysis_rate)
+        silence = envelope.get_silence(pause_seconds, volume_cap,
+                                       parent_thread)
+        if analysed is not audio:
+            silence = analysed.map_silence(silence)
+        # An empty file has no amplitudes.
+        return Segments(file_name, audio.framerate, audio.frames, silence,
+                        int(envelope.min_amplitude or 0),
+                        int(envelope.max_amplitude or 0),
+                        float(envelope.median_volume()))
+    except findsilence.Cancelled:
+        raise
+    except Exception as e:
+        return Segments(file_name, error=unicode(e) or type(e).__name__)
+
+
+def _analyse_file(job):
+    """ analyse_file for the worker processes of analyse. """
+    file_name, kwargs = job
+    return analyse_file(file_name, **kwargs)
+
+
+def analyse(file_names, jobs=1, pause_seconds=2, volume_cap=300,
+            parent_thread=None, engine=defaults.engine, cache=None,
+            analysis_rate=None):
+    """ Yield the Segments of every file in file_names, in their order. If
+    jobs is more than one, as many files are analysed at once in worker
+    processes. The other arguments are the ones of analyse_file. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    notifier = findsilence.get_notifier(parent_thread)
+    if jobs < 2:
+        for file_name in file_names:
+            yield analyse_file(file_name, pause_seconds, volume_cap,
+                               parent_thread, engine, cache, analysis_rate)
+            notifier.count('files')
+        return
+    kwargs = dict(pause_seconds=pause_seconds, volume_cap=volume_cap,
+                  engine=engine, cache=cache, analysis_rate=analysis_rate)
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for segments in pool.imap(_analyse_file,
+                                  ((file_name, kwargs)
+                                   for file_name in file_names)):
+            if parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            yield segments
+            notifier.count('files')
+        pool.close()
+    finally:
+        # Stops the workers if the caller stopped early or was cancelled.
+        pool.terminate()
+        pool.join()
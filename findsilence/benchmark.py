@@ -0,0 +1,385 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Benchmarks on synthetic recordings.
+
+generate writes a WAV file of loud tone separated by pauses of noise at known
+positions. Every benchmark runs in a process of its own, so that the peak
+memory it reports is its own, and checks its result against these positions.
+The results are written as JSON, and compare prints the change of throughput
+against the results of an earlier run. """
+
+import array
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+# Enable users to run the file without installing the program.
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                 os.pardir))
+
+from optparse import OptionParser
+
+import findsilence
+from findsilence import defaults
+
+BENCHMARKS = ('get_silence', 'envelope', 'split_into', 'amplitude',
+              'split_phono')
+# 8 bit samples are unsigned in WAV files, which the silence detection does
+# not account for, so they are not benchmarked.
+TYPECODES = {2: 'h', 4: 'i'}
+# Amplitude of the tone relative to full scale.
+TONE = 0.5
+# The benchmarks look for pauses this much shorter than the ones in the
+# recording. Silence is found in steps of the pause length, so boundaries
+# may be off by up to that much.
+PAUSE_FRACTION = 1 / 3.0
+
+
+class Recording(object):
+    """ Parameters of a synthetic recording and the positions of its pauses
+    in frames. noise is the amplitude of the noise floor relative to full
+    scale. """
+    def __init__(self, seconds=600, framerate=44100, width=2, channels=2,
+                 noise=0.001, pauses=10, pause_seconds=3, seed=0):
+        if width not in TYPECODES:
+            raise ValueError("Unsupported sample width %r" % (width, ))
+        self.seconds = seconds
+        self.framerate = framerate
+        self.width = width
+        self.channels = channels
+        self.noise = noise
+        self.pauses = pauses
+        self.pause_seconds = pause_seconds
+        self.seed = seed
+        self.frames = int(seconds * framerate)
+        self.silence = self.layout()
+
+    def full_scale(self):
+        return 2 ** (8 * self.width - 1) - 1
+
+    def volume_cap(self):
+        """ A volume cap well between noise floor and tone. """
+        return int(4 * self.noise * self.full_scale()) + 1
+
+    def layout(self):
+        """ Return the [start, end] frames of the pauses. They are spread
+        evenly, moved by up to a quarter of a track, so that no pause is at
+        the beginning or the end of the recording. """
+        r = random.Random(self.seed)
+        pause_frames = int(self.pause_seconds * self.framerate)
+        track_frames = (self.frames - self.pauses * pause_frames) // \
+                       (self.pauses + 1)
+        if track_frames <= 0:
+            raise ValueError("The pauses do not fit into the recording")
+        silence = []
+        for i in xrange(self.pauses):
+            start = (i + 1) * track_frames + i * pause_frames
+            start += int(r.uniform(-0.25, 0.25) * track_frames)
+            silence.append([start, start + pause_frames])
+        return silence
+
+    def tracks(self):
+        """ Amount of tracks the recording is split into. Tracks end at a
+        pause, so the end of the recording is not one. """
+        return self.pauses
+
+    def params(self):
+        return {'seconds': self.seconds, 'framerate': self.framerate,
+                'width': self.width, 'channels': self.channels,
+                'noise': self.noise, 'pauses': self.pauses,
+                'pause_seconds': self.pause_seconds, 'seed': self.seed}
+
+    def block(self, tone):
+        """ Return two seconds of noise, with the tone if tone is True, as
+        bytes. One second repeats exactly, so any second of the recording
+        can be sliced out of it. """
+        r = random.Random(self.seed)
+        full_scale = self.full_scale()
+        noise = int(self.noise * full_scale)
+        samples = array.array(TYPECODES[self.width])
+        for k in xrange(self.framerate):
+            v = r.randint(-noise, noise)
+            if tone:
+                v += int(TONE * full_scale *
+                         math.sin(2 * math.pi * 440 * k / self.framerate))
+            samples.extend([v] * self.channels)
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        return samples.tostring() * 2
+
+    def generate(self, file_name):
+        """ Write the recording to file_name. """
+        blocks = {False: self.block(False), True: self.block(True)}
+        frame_size = self.width * self.channels
+        f = wave.open(file_name, 'wb')
+        try:
+            f.setnchannels(self.channels)
+            f.setsampwidth(self.width)
+            f.setframerate(self.framerate)
+            f.setnframes(self.frames)
+            borders = [0]
+            for start, end in self.silence:
+                borders.extend([start, end])
+            borders.append(self.frames)
+            for k in xrange(len(borders) - 1):
+                data = blocks[k % 2 == 0]
+                pos = borders[k]
+                while pos < borders[k + 1]:
+                    offset = pos % self.framerate
+                    n = min(borders[k + 1] - pos, self.framerate)
+                    f.writeframes(data[offset * frame_size:
+                                       (offset + n) * frame_size])
+                    pos += n
+        finally:
+            f.close()
+
+
+def peak_rss():
+    """ Return the peak resident set size of the process in bytes, or None
+    if unknown. """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+def check_silence(recording, silence):
+    """ Return whether silence matches the pauses of recording and the
+    largest difference of their boundaries in seconds. """
+    tolerance = recording.pause_seconds * PAUSE_FRACTION
+    if len(silence) != len(recording.silence):
+        return False, None
+    error = 0
+    for (start, end), (s, e) in zip(recording.silence, silence):
+        error = max(error, abs(start - s), abs(end - e))
+    error /= float(recording.framerate)
+    return error <= tolerance, error
+
+
+def run_benchmark(name, file_name, recording, engine):
+    """ Run benchmark name on file_name. Return its wall time in seconds,
+    whether its result was correct and details on the result. """
+    pause_seconds = recording.pause_seconds * PAUSE_FRACTION
+    volume_cap = recording.volume_cap()
+    started = time.time()
+    if name == 'get_silence':
+        audio = findsilence.Audio.from_file(file_name)
+        silence = audio.get_silence(pause_seconds, volume_cap, engine=engine)
+        elapsed = time.time() - started
+        correct, error = check_silence(recording, silence)
+        details = {'pauses': len(silence), 'error_seconds': error}
+    elif name == 'envelope':
+        audio = findsilence.Audio.from_file(file_name)
+        silence = audio.envelope(engine=engine).get_silence(pause_seconds,
+                                                            volume_cap)
+        elapsed = time.time() - started
+        correct, error = check_silence(recording, silence)
+        details = {'pauses': len(silence), 'error_seconds': error}
+    elif name == 'split_into':
+        audio, silence = findsilence.analyse(
+            file_name, pause_seconds, min_length=1,
+            tracks=recording.tracks(), engine=engine
+        )
+        elapsed = time.time() - started
+        correct, error = check_silence(recording, silence)
+        details = {'pauses': len(silence), 'error_seconds': error}
+    elif name == 'amplitude':
+        audio = findsilence.Audio.from_file(file_name)
+        low, high = audio.min_amplitude, audio.max_amplitude
+        elapsed = time.time() - started
+        correct = low < volume_cap < high
+        details = {'min_amplitude': low, 'max_amplitude': high}
+    elif name == 'split_phono':
+        directory = tempfile.mkdtemp()
+        try:
+            started = time.time()
+            tracks = findsilence.split_phono(
+                file_name, directory, pause_seconds, volume_cap,
+                min_length=1, engine=engine
+            )
+            elapsed = time.time() - started
+            written = len(os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
+        correct = tracks == written == recording.tracks()
+        details = {'tracks': tracks}
+    else:
+        raise ValueError("Unknown benchmark %r" % (name, ))
+    return elapsed, correct, details, peak_rss()
+
+
+def benchmark(name, file_name, recording, engine=defaults.engine, repeat=1):
+    """ Run benchmark name repeat times, each in a process of its own, and
+    return the result of the fastest run as a dict. """
+    best = None
+    for i in xrange(repeat):
+        pool = multiprocessing.Pool(1)
+        try:
+            run = pool.apply(run_benchmark,
+                             (name, file_name, recording, engine))
+        finally:
+            pool.close()
+            pool.join()
+        if best is None or run[0] < best[0]:
+            best = run
+    elapsed, correct, details, rss = best
+    result = {'name': name, 'engine': engine, 'seconds': elapsed,
+              'throughput': recording.seconds / max(elapsed, 1e-9),
+              'peak_rss': rss, 'correct': correct}
+    result.update(details)
+    return result
+
+
+def run(recording, names=BENCHMARKS, engine=defaults.engine, repeat=1,
+        file_name=None):
+    """ Generate recording and run the benchmarks in names on it. Return
+    the results as a dict that can be stored as JSON. The recording is
+    written to file_name, or to a temporary file that is removed again. """
+    temporary = file_name is None
+    if temporary:
+        fd, file_name = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+    try:
+        recording.generate(file_name)
+        results = [benchmark(name, file_name, recording, engine, repeat)
+                   for name in names]
+    finally:
+        if temporary:
+            os.remove(file_name)
+    return {'version': findsilence.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'recording': recording.params(),
+            'results': results}
+
+
+def compare(old, new):
+    """ Return lines comparing the throughput of the results new to old. """
+    before = dict(((r['name'], r['engine']), r) for r in old['results'])
+    lines = []
+    for result in new['results']:
+        line = '%-12s %-6s %10.1fx' % (result['name'], result['engine'],
+                                       result['throughput'])
+        previous = before.get((result['name'], result['engine']))
+        if previous is not None:
+            line += ' %+7.1f%%' % (
+                100 * (result['throughput'] / previous['throughput'] - 1)
+            )
+        if not result['correct']:
+            line += ' WRONG'
+        lines.append(line)
+    return lines
+
+
+def main(argv=None):
+    """ Entry point of the benchmark command line interface. """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser("findsilence-benchmark [options] [benchmarks]")
+    parser.add_option("-l", "--length", action="store", type="float",
+                      dest="seconds", metavar="SECONDS", default=600,
+                      help="generate a recording of SECONDS seconds")
+    parser.add_option("-r", "--rate", action="store", type="int",
+                      dest="framerate", metavar="HZ", default=44100,
+                      help="frames per second of the recording")
+    parser.add_option("-w", "--width", action="store", type="choice",
+                      dest="width", metavar="BYTES", default='2',
+                      choices=[str(width) for width in sorted(TYPECODES)],
+                      help="bytes per sample of the recording")
+    parser.add_option("-c", "--channels", action="store", type="int",
+                      dest="channels", metavar="N", default=2,
+                      help="channels of the recording")
+    parser.add_option("-n", "--noise", action="store", type="float",
+                      dest="noise", metavar="AMPLITUDE", default=0.001,
+                      help="amplitude of the noise floor relative to full "
+                      "scale")
+    parser.add_option("-p", "--pauses", action="store", type="int",
+                      dest="pauses", metavar="N", default=10,
+                      help="put N pauses into the recording")
+    parser.add_option("-s", "--pause", action="store", type="float",
+                      dest="pause_seconds", metavar="SECONDS", default=3,
+                      help="length of the pauses")
+    parser.add_option("--seed", action="store", type="int", dest="seed",
+                      default=0, help="seed of the noise and the layout")
+    parser.add_option("-e", "--engine", action="store", type="choice",
+                      dest="engine", metavar="ENGINE",
+                      choices=findsilence.ENGINES, default=defaults.engine,
+                      help="silence detection engine: %s" %
+                      ", ".join(findsilence.ENGINES))
+    parser.add_option("--repeat", action="store", type="int", dest="repeat",
+                      metavar="N", default=1,
+                      help="run every benchmark N times and keep the fastest")
+    parser.add_option("-k", "--keep", action="store", type="string",
+                      dest="keep", metavar="FILE", default=None,
+                      help="keep the generated recording as FILE")
+    parser.add_option("-o", "--output", action="store", type="string",
+                      dest="output", metavar="FILE", default=None,
+                      help="write the results to FILE as JSON")
+    parser.add_option("--compare", action="store", type="string",
+                      dest="compare", metavar="FILE", default=None,
+                      help="compare the throughput to the results in FILE")
+    options, args = parser.parse_args(argv)
+    for name in args:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark %r. Choose from %s." %
+                         (name, ", ".join(BENCHMARKS)))
+
+    recording = Recording(options.seconds, options.framerate,
+                          int(options.width), options.channels,
+                          options.noise, options.pauses,
+                          options.pause_seconds, options.seed)
+    results = run(recording, args or BENCHMARKS, options.engine,
+                  options.repeat, options.keep)
+
+    if options.output is not None:
+        f = open(options.output, 'w')
+        try:
+            json.dump(results, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+
+    old = {'results': []}
+    if options.compare is not None:
+        f = open(options.compare)
+        try:
+            old = json.load(f)
+        finally:
+            f.close()
+    for line in compare(old, results):
+        print line
+
+
+if __name__ == "__main__":
+    main()
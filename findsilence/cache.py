@@ -0,0 +1,158 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" On-disk cache of envelopes.
+
+Computing the Envelope is the expensive part of splitting a file, while
+finding the silence in it for different settings is cheap. The Cache stores
+envelopes in a directory, keyed by the path, size and modification time of
+the file and the window length, so that splitting the same file again does
+not need to decode it. """
+
+import array
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+
+import findsilence
+from findsilence import defaults
+
+MAGIC = b'FSENV002'
+# Magic, byte order, frames, framerate, window_frames, windows,
+# min_amplitude, max_amplitude. The framerate of a Proxy need not be whole.
+HEADER = struct.Struct('<8s1sQdIQQQ')
+
+
+class Cache(object):
+    """ Envelopes stored in directory. If the files in it take up more than
+    max_size bytes, the least recently used ones are removed. """
+    suffix = '.env'
+
+    def __init__(self, directory=defaults.cache_dir,
+                 max_size=defaults.cache_size):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, file_name, window_seconds, analysis_rate=None):
+        """ Return the name of the cache file for file_name. It changes when
+        the file does. """
+        stat = os.stat(file_name)
+        key = '%s\0%d\0%r\0%r' % (os.path.abspath(file_name), stat.st_size,
+                                  stat.st_mtime, float(window_seconds))
+        if analysis_rate:
+            key += '\0%d' % analysis_rate
+        if not isinstance(key, bytes):
+            key = key.encode('utf-8')
+        return os.path.join(self.directory,
+                            hashlib.sha1(key).hexdigest() + self.suffix)
+
+    def load(self, file_name, window_seconds=defaults.window_seconds,
+             analysis_rate=None):
+        """ Return the cached Envelope of file_name, or of its Proxy if 
+        analysis_rate is given, or None. """
+        path = self.path(file_name, window_seconds, analysis_rate)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            header = f.read(HEADER.size)
+            data = f.read()
+        finally:
+            f.close()
+        if len(header) < HEADER.size:
+            self.misses += 1
+            return None
+        (magic, byteorder, frames, framerate, window_frames, windows,
+         min_amplitude, max_amplitude) = HEADER.unpack(header)
+        if magic != MAGIC or len(data) != windows * 8:
+            self.misses += 1
+            return None
+        rms = array.array('d')
+        rms.fromstring(data)
+        if byteorder != sys.byteorder[0].encode('ascii'):
+            rms.byteswap()
+        envelope = findsilence.Envelope(frames, framerate, window_frames, rms)
+        envelope._min_amplitude = min_amplitude
+        envelope._max_amplitude = max_amplitude
+        # Mark as recently used.
+        os.utime(path, None)
+        self.hits += 1
+        return envelope
+
+    def store(self, file_name, envelope,
+              window_seconds=defaults.window_seconds, analysis_rate=None):
+        """ Store envelope as the one of file_name and evict old entries. 
+        Empty envelopes, which have no amplitudes, are not worth storing. """
+        if not len(envelope.rms):
+            return
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        header = HEADER.pack(
+            MAGIC, sys.byteorder[0].encode('ascii'), envelope.frames,
+            envelope.framerate, envelope.window_frames, len(envelope.rms),
+            envelope.min_amplitude, envelope.max_amplitude
+        )
+        # Write to a temporary file first, so that other processes never
+        # see half of an entry.
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(header)
+                f.write(envelope.rms.tostring())
+            finally:
+                f.close()
+            os.rename(temp, self.path(file_name, window_seconds,
+                                      analysis_rate))
+        except:
+            os.remove(temp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """ Return (last use, size, path) of all entries. """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed by another process.
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache is not
+        larger than max_size. """
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        for mtime, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
@@ -16,12 +16,19 @@
 
 """ Command line interface """
 
+import itertools
+import json
+import multiprocessing
 import os
 import re
 import sys
+import warnings
 
 import findsilence
-from findsilence import defaults
+import findsilence.service
+from findsilence import defaults, export, stream
+from findsilence.cache import Cache
+from findsilence.instrument import Collector
 
 
 def check_overwrite(args, options):
@@ -45,6 +52,20 @@ def check_overwrite(args, options):
     return True
 
 
+def check_conflicts(parser, option, conflicts):
+    """ Exit with an error if option is used along with any of conflicts, 
+    a list of (option, whether it is used) pairs. """
+    used = [name for name, value in conflicts if value]
+    if used:
+        parser.error("%s cannot be used with %s" % (option, ", ".join(used)))
+
+
+def show_warning(message, category, filename, lineno, file=None, line=None):
+    """ Print warnings such as findsilence.TrackCountWarning to stderr 
+    without the source line that issued them. """
+    print >> sys.stderr, "Warning: %s" % message
+
+
 def lendir_if(path, cond):
     """ Count all elements in path where cond evaluates True. """
     return sum(1 for x in os.listdir(path) if cond(x))
@@ -58,10 +79,56 @@ def get_output_name(track):
 def create_cli(options, args, parser):
     """ Create the CLI according to options and args. Parser is needed to show 
     help upon invalid input """
+    warnings.showwarning = show_warning
+    if options.watch:
+        create_service(options, args, parser)
+        return
     tracks = len(args)
     if tracks < 1:
         print parser.get_usage()
         sys.exit(1)
+    if '-' in args:
+        create_stream_cli(options, args, parser)
+        return
+    if options.follow:
+        # Only findsilence.follow splits a file that is still growing.
+        check_conflicts(parser, '--follow', [
+            ('--analyse', options.format),
+            ('--tracks', options.tracks is not None),
+            ('--cache', options.cache or options.cache_dir),
+            ('--coarse-to-fine', options.coarse_to_fine),
+            ('--analysis-rate', options.analysis_rate),
+            ('--jobs for a single file', tracks < 2 and options.jobs > 1),
+        ])
+    if options.pipeline:
+        check_conflicts(parser, '--pipeline', [
+            ('--analyse', options.format),
+            ('--tracks', options.tracks is not None),
+            ('--cache', options.cache or options.cache_dir),
+            ('--coarse-to-fine', options.coarse_to_fine),
+            ('--analysis-rate', options.analysis_rate),
+            ('--follow', options.follow),
+            ('--jobs for a single file', tracks < 2 and options.jobs > 1),
+        ])
+    kwargs = dict(pause_seconds=options.pause, volume_cap=options.volume_cap,
+                  min_length=options.min_, tracks=options.tracks,
+                  engine=options.engine, 
+                  coarse_to_fine=options.coarse_to_fine,
+                  analysis_rate=options.analysis_rate)
+    if options.cache or options.cache_dir:
+        kwargs['cache'] = Cache(options.cache_dir or defaults.cache_dir,
+                                options.cache_size * 1024 * 1024)
+    if tracks < 2:
+        # A single file is analysed in parallel instead.
+        kwargs['jobs'] = options.jobs
+    
+    if options.format:
+        # Only print the split points, nothing is written.
+        run(analyse_file, 
+            [(track, options.format, kwargs, bool(options.stats)) 
+             for track in args], options, sys.stderr)
+        return
+    
     if not options.output:
         # If not output directory is specified, fall back to output in the 
         # current working directory.
@@ -75,6 +142,11 @@ def create_cli(options, args, parser):
                'overwritten by the program. Skipping.')
         sys.exit(2)
     
+    kwargs['buffer_frames'] = options.buffer_frames
+    kwargs['pipeline'] = options.pipeline
+    kwargs['follow'] = options.follow
+    kwargs['idle_seconds'] = options.idle
+    jobs = []
     for track in args:
         if tracks > 1:
             # If there is more than one track, put each of them into a 
@@ -83,12 +155,189 @@ def create_cli(options, args, parser):
             os.mkdir(output)
         else:
             output = options.output
+        jobs.append((track, output, kwargs, bool(options.stats)))
+    run(split_file, jobs, options)
+
+
+def create_stream_cli(options, args, parser):
+    """ Split the input read from stdin, which args refers to as '-'. """
+    if len(args) > 1 or options.format or options.tracks is not None:
+        parser.error("- cannot be used with other input files, --analyse or "
+                     "--tracks")
+    # findsilence.stream.split_phono reads the input once, in one process.
+    check_conflicts(parser, '-', [
+        ('--pipeline', options.pipeline),
+        ('--follow', options.follow),
+        ('--coarse-to-fine', options.coarse_to_fine),
+        ('--analysis-rate', options.analysis_rate),
+        ('--cache', options.cache or options.cache_dir),
+        ('--engine', options.engine != defaults.engine),
+        ('--jobs', options.jobs > 1),
+    ])
+    kwargs = dict(pause_seconds=options.pause, volume_cap=options.volume_cap,
+                  min_length=options.min_, 
+                  buffer_frames=options.buffer_frames)
+    if options.raw:
         try:
-            findsilence.split_phono(track, output, options.pause, 
-                                    options.volume_cap, 
-                                    min_length=options.min_,
-                                    tracks=options.tracks)
-        except findsilence.Cancelled:
-            print "Operation Cancelled"
-        except findsilence.NoSilence:
-            print "No silence found in %s" % track
+            framerate, channels, width = map(int, options.raw.split(','))
+        except ValueError:
+            parser.error("--raw takes RATE,CHANNELS,WIDTH")
+        kwargs['fmt'] = (channels, framerate, width)
+    if not options.output:
+        options.output = os.path.join(os.getcwdu(), "output")
+    if not os.path.exists(options.output):
+        os.mkdir(options.output)
+    elif not check_overwrite(args, options) and not options.force:
+        print ('Output directory contains files that may be '
+               'overwritten by the program. Skipping.')
+        sys.exit(2)
+    run(split_file, [('-', options.output, kwargs, bool(options.stats))], 
+        options)
+
+
+def create_service(options, args, parser):
+    """ Split the files arriving in the --watch directory until interrupted.
+    """
+    if args:
+        parser.error("--watch takes no input files")
+    if options.pipeline:
+        # --jobs is the amount of workers here, each analysing on its own.
+        check_conflicts(parser, '--pipeline', [
+            ('--tracks', options.tracks is not None),
+            ('--cache', options.cache or options.cache_dir),
+            ('--coarse-to-fine', options.coarse_to_fine),
+            ('--analysis-rate', options.analysis_rate),
+        ])
+    kwargs = dict(pause_seconds=options.pause, volume_cap=options.volume_cap,
+                  min_length=options.min_, tracks=options.tracks,
+                  engine=options.engine, 
+                  coarse_to_fine=options.coarse_to_fine,
+                  analysis_rate=options.analysis_rate,
+                  buffer_frames=options.buffer_frames,
+                  pipeline=options.pipeline)
+    if options.cache or options.cache_dir:
+        kwargs['cache'] = Cache(options.cache_dir or defaults.cache_dir,
+                                options.cache_size * 1024 * 1024)
+    service = findsilence.service.serve(
+        options.watch, options.output or os.path.join(os.getcwdu(), "output"),
+        workers=options.jobs, done=options.done, 
+        queue_size=options.queue_size, timeout=options.timeout,
+        status_file=options.status, **kwargs
+    )
+    if options.verbose >= 0:
+        print ("Split %d files into %d tracks. %d without silence, %d timed "
+               "out, %d failed." % (service.counts['done'], service.tracks,
+                                    service.counts['nosilence'],
+                                    service.counts['timeout'],
+                                    service.counts['failed']))
+
+
+def run(function, jobs, options, messages=sys.stdout):
+    """ Call function for every job, in --jobs processes if there is more 
+    than one, and report the results. """
+    if options.jobs > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(options.jobs, len(jobs)))
+        try:
+            report(pool.imap(function, jobs), options, messages)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        report(itertools.imap(function, jobs), options, messages)
+
+
+def collect(track, kwargs, stats):
+    """ Return kwargs with a Collector for track as notifier if stats is 
+    True, and the collector. """
+    if not stats:
+        return kwargs, None
+    collector = Collector(track)
+    return dict(kwargs, parent_thread=collector.thread()), collector
+
+
+def split_file(job):
+    """ Split one input file. job is a tuple of the input file, the output
+    directory, the keyword arguments for split_phono, or those of 
+    findsilence.stream.split_phono if the input file is '-' for stdin, and
+    whether to collect statistics. Return the input file, the outcome, the 
+    amount of tracks written, the text to print and the statistics or None.
+    This is run in the worker processes of --jobs. """
+    track, output, kwargs, stats = job
+    kwargs, collector = collect(track, kwargs, stats)
+    try:
+        if track == '-':
+            # Neither the files nor their splitting need to be seekable.
+            stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+            written = stream.split_phono(stdin, output, **kwargs)
+        else:
+            written = findsilence.split_phono(track, output, **kwargs)
+    except findsilence.Cancelled:
+        return track, 'cancelled', 0, None, collector and collector.as_dict()
+    except findsilence.NoSilence:
+        return track, 'nosilence', 0, None, collector and collector.as_dict()
+    return track, 'done', written, None, collector and collector.as_dict()
+
+
+def analyse_file(job):
+    """ Find the split points of one input file. job is a tuple of the input
+    file, the export format, the keyword arguments for findsilence.analyse
+    and whether to collect statistics. Return values are the same as for 
+    split_file. """
+    track, format, kwargs, stats = job
+    kwargs, collector = collect(track, kwargs, stats)
+    try:
+        audio, silence = findsilence.analyse(track, **kwargs)
+    except findsilence.Cancelled:
+        return track, 'cancelled', 0, None, collector and collector.as_dict()
+    except findsilence.NoSilence:
+        return track, 'nosilence', 0, None, collector and collector.as_dict()
+    tracks = list(audio.tracks(silence, kwargs['min_length']))
+    if collector is not None:
+        collector.done()
+    return track, 'done', len(tracks), export.export(
+        format, track, audio.framerate, audio.frames, tracks
+    ), collector and collector.as_dict()
+
+
+def report(results, options, messages=sys.stdout):
+    """ Print the outcome of every file in results as it comes in and a 
+    summary at the end if there was more than one file. Messages go to 
+    messages, the text returned by the jobs goes to stdout. """
+    files = done = written = no_silence = cancelled = 0
+    stats = []
+    for track, outcome, n, text, file_stats in results:
+        files += 1
+        if file_stats is not None:
+            file_stats['outcome'] = outcome
+            stats.append(file_stats)
+        if outcome == 'cancelled':
+            cancelled += 1
+            print >> messages, "Operation Cancelled"
+        elif outcome == 'nosilence':
+            no_silence += 1
+            print >> messages, "No silence found in %s" % track
+        else:
+            done += 1
+            written += n
+            if text is not None:
+                print text
+    if files > 1 and options.verbose >= 0:
+        print >> messages, ("Split %d of %d files into %d tracks. "
+                            "%d without silence, %d cancelled." % 
+                            (done, files, written, no_silence, cancelled))
+    if options.stats:
+        write_stats(options.stats, stats)
+
+
+def write_stats(file_name, stats):
+    """ Write the statistics of all files as JSON into file_name, or to 
+    stderr if it is '-'. """
+    if file_name == '-':
+        json.dump(stats, sys.stderr, indent=1, sort_keys=True)
+        print >> sys.stderr
+        return
+    f = open(file_name, 'w')
+    try:
+        json.dump(stats, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
@@ -19,3 +19,18 @@
 pause_seconds = 3
 volume_cap = 200
 min_length = 20
+# Length of the windows the loudness envelope is made of.
+window_seconds = 0.01
+# Silence detection engine, one of findsilence.ENGINES.
+engine = 'python'
+# Amount of frames copied at once when writing tracks.
+buffer_frames = 2 ** 16
+# Amount of input files split in parallel by the CLI.
+jobs = 1
+# Directory and maximum size in bytes of the envelope cache.
+cache_dir = '~/.cache/findsilence'
+cache_size = 256 * 1024 * 1024
+# Seconds between two looks at a file that is being recorded, and seconds
+# it has to stay the same size to be taken as finished.
+poll_seconds = 1
+idle_seconds = 10
@@ -0,0 +1,66 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Describe the tracks of a file instead of writing them. The tracks are
+the (from_pos, to_pos) frame ranges yielded by Audio.tracks. """
+
+import json
+import os
+
+FORMATS = ('json', 'cue')
+
+
+def track_list(framerate, tracks):
+    """ Return a list of dicts holding start and end of every track in frames
+    and seconds. """
+    return [{'start': from_pos, 'end': to_pos,
+             'start_seconds': from_pos / float(framerate),
+             'end_seconds': to_pos / float(framerate)}
+            for from_pos, to_pos in tracks]
+
+
+def to_json(file_name, framerate, frames, tracks):
+    """ Return the tracks of file_name as a JSON document on one line. """
+    return json.dumps({'file': file_name, 'framerate': framerate,
+                       'frames': frames,
+                       'tracks': track_list(framerate, tracks)},
+                      sort_keys=True)
+
+
+def cue_time(frame, framerate):
+    """ Format frame as the MM:SS:FF of a cue sheet, FF being 1/75 s. """
+    cd_frames = frame * 75 // framerate
+    seconds, cd_frames = divmod(cd_frames, 75)
+    minutes, seconds = divmod(seconds, 60)
+    return '%.2d:%.2d:%.2d' % (minutes, seconds, cd_frames)
+
+
+def to_cue(file_name, framerate, frames, tracks):
+    """ Return a cue sheet with the tracks of file_name. """
+    lines = ['FILE "%s" WAVE' % os.path.basename(file_name)]
+    for i, (from_pos, to_pos) in enumerate(tracks):
+        lines.append('  TRACK %.2d AUDIO' % (i + 1))
+        lines.append('    INDEX 01 %s' % cue_time(from_pos, framerate))
+    return '\n'.join(lines)
+
+
+def export(format, file_name, framerate, frames, tracks):
+    """ Describe the tracks of file_name in format, one of FORMATS. """
+    if format == 'json':
+        return to_json(file_name, framerate, frames, tracks)
+    elif format == 'cue':
+        return to_cue(file_name, framerate, frames, tracks)
+    raise ValueError("Unknown format %r" % (format, ))
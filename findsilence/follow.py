@@ -0,0 +1,182 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Split a file while it is still being recorded.
+
+The Follower re-reads the header and the length of the file on every poll,
+extends the envelope by the windows that have been completed since and
+continues the silence detection where it stopped, including a pause that
+has not ended yet. A track is written as soon as the pause after it has
+been found, which is once pause_seconds of silence have been recorded. The
+result is the same as the one of findsilence.split_phono on the finished
+file. """
+
+import os
+import time
+
+import findsilence
+from findsilence import defaults
+
+
+class Follower(object):
+    """ Silence detection state of a growing file. Every call of poll
+    analyses the frames added since the last one and writes the tracks that
+    are complete into directory. """
+    def __init__(self, file_name, directory, pause_seconds=2, volume_cap=300,
+                 min_length=10, parent_thread=None, engine=defaults.engine,
+                 buffer_frames=defaults.buffer_frames):
+        if parent_thread is None:
+            parent_thread = findsilence.DummyThread()
+        self.parent_thread = parent_thread
+        self.audio = findsilence.StreamedWave(file_name)
+        self.directory = directory
+        self.volume_cap = volume_cap
+        self.min_frames = min_length * self.audio.framerate
+        self.engine = engine
+        self.buffer_frames = buffer_frames
+        self.window_frames = max(
+            1, int(defaults.window_seconds * self.audio.framerate)
+        )
+        self.envelope = findsilence.Envelope(0, self.audio.framerate,
+                                             self.window_frames)
+        self.block = self.envelope.windows(pause_seconds)
+        self.silence = []
+        self.written = 0
+        self.frames = 0
+        # Window the next step of the scan begins at and, while a pause is
+        # being extended, the window it has been extended to.
+        self.i = 0
+        self.run_end = None
+
+    def poll(self, complete=False):
+        """ Analyse what has been added to the file. If complete is True, the
+        file is not going to grow anymore and is analysed to its end. Return
+        whether it has grown. """
+        audio = self.audio
+        envelope = self.envelope
+        rms = envelope.rms
+        notifier = findsilence.get_notifier(self.parent_thread)
+        frames = audio.refresh()
+        grown = frames > self.frames
+        if grown:
+            self.frames = frames
+            notifier.total_frames(frames)
+        if complete:
+            windows = -(-frames // self.window_frames)
+        else:
+            # The last window is only analysed once it is complete.
+            windows = frames // self.window_frames
+        if windows > len(rms):
+            notifier.phase_start('envelope')
+            start = envelope.position(len(rms))
+            rms.extend(audio.window_rms(self.window_frames, len(rms),
+                                        windows, self.parent_thread,
+                                        self.engine))
+            notifier.phase_end('envelope', frames - start)
+        if complete:
+            envelope.frames = frames
+        else:
+            envelope.frames = len(rms) * self.window_frames
+        notifier.phase_start('scan')
+        self.scan(complete)
+        notifier.phase_end('scan')
+        notifier.current_frame(envelope.frames)
+        return grown
+
+    def scan(self, complete):
+        """ Continue the silence detection of Envelope.scan as far as the
+        envelope goes. """
+        envelope = self.envelope
+        rms = envelope.rms
+        n = len(rms)
+        while self.i < n:
+            if self.parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            if self.run_end is None:
+                if self.i + self.block > n and not complete:
+                    # The step needs windows that have not been recorded.
+                    break
+                j = min(self.i + self.block, n)
+                if envelope.block_rms(self.i, j) >= self.volume_cap:
+                    self.i = j
+                    continue
+                self.begin(envelope.position(self.i))
+                self.run_end = j
+            # Like Envelope.scan, extend the pause up to and including the
+            # first loud window.
+            while self.run_end < n:
+                self.run_end += 1
+                if rms[self.run_end - 1] >= self.volume_cap:
+                    break
+            else:
+                if not complete:
+                    # The pause may go on.
+                    break
+            self.silence[-1][1] = envelope.position(self.run_end)
+            self.i = self.run_end
+            self.run_end = None
+
+    def begin(self, start):
+        """ A pause begins at frame start. Write the track before it unless
+        the pause continues the previous one. """
+        silence = self.silence
+        if silence and silence[-1][1] == start:
+            return
+        from_pos = silence[-1][1] if silence else 0
+        silence.append([start, start])
+        if start - from_pos < self.min_frames:
+            return
+        notifier = findsilence.get_notifier(self.parent_thread)
+        f_name = os.path.join(self.directory, "track_%.2d.wav" % self.written)
+        notifier.phase_start('write')
+        self.audio.write_track(f_name, from_pos, start, self.buffer_frames)
+        notifier.phase_end('write', start - from_pos)
+        self.written += 1
+
+    def close(self):
+        self.audio.close()
+
+
+def split_phono(file_name, directory, pause_seconds=2, volume_cap=300,
+                min_length=10, parent_thread=None, engine=defaults.engine,
+                buffer_frames=defaults.buffer_frames,
+                poll_seconds=defaults.poll_seconds,
+                idle_seconds=defaults.idle_seconds):
+    """ Split file_name while it is being recorded, polling it every
+    poll_seconds seconds. Once it has not grown for idle_seconds seconds,
+    the recording is taken to be finished. The directory has to exist.
+    Return the amount of tracks written. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    follower = Follower(file_name, directory, pause_seconds, volume_cap,
+                        min_length, parent_thread, engine, buffer_frames)
+    try:
+        last_growth = time.time()
+        while True:
+            if parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            if follower.poll():
+                last_growth = time.time()
+            elif time.time() - last_growth >= idle_seconds:
+                follower.poll(complete=True)
+                break
+            time.sleep(poll_seconds)
+    finally:
+        follower.close()
+    if not follower.silence:
+        raise findsilence.NoSilence
+    findsilence.get_notifier(parent_thread).done()
+    return follower.written
@@ -0,0 +1,117 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Record where the time goes while a file is split.
+
+The functions of findsilence report the beginning and end of their phases,
+such as 'envelope', 'scan', 'solve', 'pyramid', 'amplitude' and 'write', and
+counters such as 'bytes_read', 'bytes_written', 'cache_hits' and
+'volume_levels' to the notifier of their parent thread. A Collector used as
+that notifier adds them up; without it they go to the DummyNotifier, which
+ignores them. """
+
+import threading
+import time
+
+import findsilence
+
+
+class Collector(findsilence.DummyNotifier):
+    """ Notifier adding up the time spent in every phase, the frames it
+    processed and the counters. It can be shared with the writer thread of
+    findsilence.pipeline. """
+    def __init__(self, file_name=None, clock=time.time):
+        self.file_name = file_name
+        self.clock = clock
+        self.frames = None
+        self.frame = 0
+        # Phase name -> [seconds, calls, frames].
+        self.phases = {}
+        # Start times of the phases that are running.
+        self.running = {}
+        self.counters = {}
+        self.started = clock()
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def thread(self):
+        """ Return a DummyThread with this collector as notifier, to be passed
+        as parent_thread. """
+        return findsilence.DummyThread(self)
+
+    def total_frames(self, frames):
+        self.frames = frames
+
+    def current_frame(self, frame):
+        self.frame = frame
+
+    def done(self):
+        self.finished = self.clock()
+
+    def phase_start(self, name):
+        self.lock.acquire()
+        try:
+            self.running[name] = self.clock()
+        finally:
+            self.lock.release()
+
+    def phase_end(self, name, frames=None):
+        now = self.clock()
+        self.lock.acquire()
+        try:
+            started = self.running.pop(name, None)
+            if started is None:
+                return
+            phase = self.phases.setdefault(name, [0.0, 0, 0])
+            phase[0] += now - started
+            phase[1] += 1
+            phase[2] += frames or 0
+        finally:
+            self.lock.release()
+
+    def count(self, name, n=1):
+        self.lock.acquire()
+        try:
+            self.counters[name] = self.counters.get(name, 0) + n
+        finally:
+            self.lock.release()
+
+    def as_dict(self):
+        """ Return everything collected so far as a dict that can be stored
+        as JSON. Phases that have not ended yet are listed in 'running' with
+        the seconds they have been running for. """
+        now = self.clock()
+        seconds = (self.finished or now) - self.started
+        self.lock.acquire()
+        try:
+            phases = {}
+            for name, (phase_seconds, calls, frames) in self.phases.items():
+                phases[name] = {'seconds': phase_seconds, 'calls': calls,
+                                'frames': frames}
+                if phase_seconds > 0:
+                    phases[name]['frames_per_second'] = frames / phase_seconds
+            running = dict((name, now - started)
+                           for name, started in self.running.items())
+            counters = dict(self.counters)
+        finally:
+            self.lock.release()
+        result = {'file': self.file_name, 'frames': self.frames,
+                  'frame': self.frame, 'seconds': seconds,
+                  'done': self.finished is not None, 'phases': phases,
+                  'running': running, 'counters': counters}
+        if self.frames and seconds > 0:
+            result['frames_per_second'] = self.frames / seconds
+        return result
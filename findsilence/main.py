@@ -25,13 +25,18 @@ sys.path.append(os.path.join(script_path, os.pardir))
 
 from optparse import OptionParser
 
-from findsilence import defaults, cli
+import findsilence
+from findsilence import defaults, cli, export
 
 def main(argv=None):
     """ Main entry point for the command line interface """
     if argv is None:
         argv = sys.argv[1:]
-    parser = OptionParser("findsilence [options] [input files]")
+    if argv and argv[0] == 'sweep':
+        from findsilence import sweep
+        return sweep.main(argv[1:])
+    parser = OptionParser("findsilence [options] [input files or - for stdin]"
+                          "\n       findsilence sweep [options] input file")
 
     parser.add_option("-f", "--force", action="store_true", 
                       dest="force", default=False,
@@ -61,6 +66,113 @@ def main(argv=None):
                       help="Adjust the volume cap until it splits into TRACKS tracks.",
                       default=None)
     
+    parser.add_option("-e", "--engine", action="store", type="choice",
+                      dest="engine", metavar="ENGINE", 
+                      choices=findsilence.ENGINES,
+                      help="Silence detection engine: %s. numpy falls back "
+                      "to python if NumPy is not installed." % 
+                      ", ".join(findsilence.ENGINES),
+                      default=defaults.engine)
+    
+    parser.add_option("-b", "--buffer", action="store", type="int",
+                      dest="buffer_frames", metavar="FRAMES",
+                      help="copy at most FRAMES frames at once when writing "
+                      "tracks", default=defaults.buffer_frames)
+    
+    parser.add_option("-j", "--jobs", action="store", type="int",
+                      dest="jobs", metavar="N",
+                      help="split up to N input files in parallel, or "
+                      "analyse a single input file in N processes",
+                      default=defaults.jobs)
+    
+    parser.add_option("-c", "--cache", action="store_true", dest="cache",
+                      default=False, help="keep the analysis of the input "
+                      "files in the cache directory and reuse it")
+    
+    parser.add_option("--cache-dir", action="store", type="string",
+                      dest="cache_dir", metavar="DIRECTORY",
+                      help="use DIRECTORY as cache directory, implies --cache",
+                      default=None)
+    
+    parser.add_option("--cache-size", action="store", type="int",
+                      dest="cache_size", metavar="MEGABYTES",
+                      help="limit the cache to MEGABYTES megabytes",
+                      default=defaults.cache_size // (1024 * 1024))
+    
+    parser.add_option("-a", "--analyse", action="store", type="choice",
+                      dest="format", metavar="FORMAT", 
+                      choices=export.FORMATS, default=None,
+                      help="do not write any tracks, print the split points "
+                      "as %s instead" % " or ".join(export.FORMATS))
+    
+    parser.add_option("-P", "--pipeline", action="store_true", 
+                      dest="pipeline", default=False,
+                      help="write tracks while the analysis is still going "
+                      "on. Cannot be used with --analyse, --tracks, --cache, "
+                      "--coarse-to-fine, --analysis-rate, --follow or, for a "
+                      "single file, --jobs")
+    
+    parser.add_option("-C", "--coarse-to-fine", action="store_true", 
+                      dest="coarse_to_fine", default=False,
+                      help="search pauses in large windows first and only "
+                      "look closer where they may be. Not used with --tracks")
+    
+    parser.add_option("-r", "--analysis-rate", action="store", type="int",
+                      dest="analysis_rate", metavar="HZ", default=None,
+                      help="analyse a mono copy of the input with about HZ "
+                      "frames per second. Tracks are still cut from the "
+                      "original")
+    
+    parser.add_option("-F", "--follow", action="store_true", 
+                      dest="follow", default=False,
+                      help="split the input while it is still being "
+                      "recorded. Cannot be used with --analyse, --tracks, "
+                      "--cache, --coarse-to-fine, --analysis-rate or, for a "
+                      "single file, --jobs")
+    
+    parser.add_option("--idle", action="store", type="float",
+                      dest="idle", metavar="SECONDS",
+                      default=defaults.idle_seconds,
+                      help="with --follow, take the recording to be finished "
+                      "once it has not grown for SECONDS")
+    
+    parser.add_option("--raw", action="store", type="string", dest="raw",
+                      metavar="RATE,CHANNELS,WIDTH", default=None,
+                      help="the input read from - is raw little-endian PCM "
+                      "with RATE frames per second, CHANNELS channels and "
+                      "WIDTH bytes per sample instead of a wave file")
+    
+    parser.add_option("--stats", action="store", type="string",
+                      dest="stats", metavar="FILE", default=None,
+                      help="write the time spent in every phase and other "
+                      "statistics of every input file to FILE as JSON, or "
+                      "to stderr if FILE is -")
+    
+    parser.add_option("-w", "--watch", action="store", type="string",
+                      dest="watch", metavar="DIRECTORY", default=None,
+                      help="run as a service splitting the files put into "
+                      "DIRECTORY into --output, in --jobs worker processes, "
+                      "until interrupted")
+    
+    parser.add_option("--done", action="store", type="string", dest="done",
+                      metavar="DIRECTORY", default=None,
+                      help="with --watch, move split files to DIRECTORY")
+    
+    parser.add_option("--timeout", action="store", type="float",
+                      dest="timeout", metavar="SECONDS", default=None,
+                      help="with --watch, cancel files taking longer than "
+                      "SECONDS")
+    
+    parser.add_option("--queue", action="store", type="int",
+                      dest="queue_size", metavar="N", default=None,
+                      help="with --watch, hand at most N files to the "
+                      "workers at once. Defaults to twice --jobs")
+    
+    parser.add_option("--status", action="store", type="string",
+                      dest="status", metavar="FILE", default=None,
+                      help="with --watch, keep the state of the service and "
+                      "counts of the outcomes in FILE as JSON")
+    
     parser.add_option('-v', '--verbose', action='count', dest='verbose',
                       help="Increase verbosity. Use -vv for very verbose")
     
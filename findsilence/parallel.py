@@ -0,0 +1,147 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Analyse a single file in several processes.
+
+The windows of the envelope are split into segments that are computed in
+worker processes. Each worker also scans its segment, and a bit further into
+the next one, for silence. The steps of these scans are then stitched
+together: the scan of a segment is taken over as soon as the scan so far
+reaches a window the segment's scan has also started a step at, because from
+there on both take the same steps. Where that does not happen, the gap is
+scanned in the parent using the complete envelope, so the result is always
+the same as Envelope.get_silence would return. """
+
+import multiprocessing
+
+import findsilence
+from findsilence import defaults
+
+
+def split_windows(windows, jobs):
+    """ Split windows into jobs ranges of about the same size. """
+    size = max(1, -(-windows // jobs))
+    return [(start, min(start + size, windows))
+            for start in xrange(0, windows, size)]
+
+
+def analyse_segment(job):
+    """ Compute the envelope of a segment and scan it for silence. Return
+    the root-mean-square of the windows of the segment as a string and the
+    steps of the scan that did not depend on windows beyond the overlap.
+    This runs in the worker processes. """
+    (file_name, window_frames, start, stop, overlap, pause_seconds,
+     silence_cap, engine) = job
+    audio = findsilence.Audio.from_file(file_name)
+    windows = -(-audio.frames // window_frames)
+    end = min(stop + overlap, windows)
+    rms = audio.window_rms(window_frames, start, end, engine=engine)
+    steps = []
+    if pause_seconds is not None:
+        local = findsilence.Envelope(
+            min(end * window_frames, audio.frames) - start * window_frames,
+            audio.framerate, window_frames, rms
+        )
+        for i, j, silent in local.scan(pause_seconds, silence_cap):
+            if j >= len(rms) and end < windows:
+                # The step might have continued in the windows we have not
+                # looked at.
+                break
+            steps.append((start + i, start + j, silent))
+    return rms[:stop - start].tostring(), steps
+
+
+def stitch(envelope, pause_seconds, silence_cap, segments,
+           parent_thread=None):
+    """ Join the steps of the segments into the steps Envelope.scan takes
+    for the whole envelope. """
+    steps = []
+    i = 0
+    for segment in segments:
+        if not segment or i > segment[-1][0]:
+            continue
+        index = dict((step[0], k) for k, step in enumerate(segment))
+        serial = envelope.scan(pause_seconds, silence_cap, i, parent_thread)
+        while i not in index and i <= segment[-1][0]:
+            step = next(serial)
+            steps.append(step)
+            i = step[1]
+        if i in index:
+            steps.extend(segment[index[i]:])
+            i = segment[-1][1]
+    steps.extend(envelope.scan(pause_seconds, silence_cap, i, parent_thread))
+    return steps
+
+
+def analyse(file_name, jobs, pause_seconds=None, silence_cap=None,
+            window_seconds=defaults.window_seconds, engine=defaults.engine,
+            parent_thread=None):
+    """ Compute the Envelope of file_name in jobs processes. If pause_seconds
+    is given, also scan it for silence. Return the envelope and the steps
+    of the scan of each segment. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    audio = findsilence.Audio.from_file(file_name)
+    window_frames = max(1, int(window_seconds * audio.framerate))
+    envelope = findsilence.Envelope(audio.frames, audio.framerate,
+                                    window_frames)
+    windows = -(-audio.frames // window_frames)
+    overlap = 0
+    if pause_seconds is not None:
+        overlap = 2 * envelope.windows(pause_seconds)
+    ranges = split_windows(windows, jobs)
+    pool = multiprocessing.Pool(min(jobs, len(ranges)) or 1)
+    try:
+        results = pool.imap(
+            analyse_segment,
+            [(file_name, window_frames, start, stop, overlap, pause_seconds,
+              silence_cap, engine) for start, stop in ranges]
+        )
+        steps = []
+        for (start, stop), (rms, segment) in zip(ranges, results):
+            if parent_thread.is_stopped():
+                pool.terminate()
+                raise findsilence.Cancelled
+            envelope.rms.fromstring(rms)
+            steps.append(segment)
+            parent_thread.notifier.current_frame(
+                min(stop * window_frames, audio.frames)
+            )
+    finally:
+        pool.close()
+        pool.join()
+    return envelope, steps
+
+
+def envelope(file_name, jobs, window_seconds=defaults.window_seconds,
+             engine=defaults.engine, parent_thread=None):
+    """ Compute the Envelope of file_name in jobs processes. """
+    return analyse(file_name, jobs, window_seconds=window_seconds,
+                   engine=engine, parent_thread=parent_thread)[0]
+
+
+def get_silence(file_name, jobs, pause_seconds=2, silence_cap=500,
+                window_seconds=defaults.window_seconds,
+                engine=defaults.engine, parent_thread=None):
+    """ Compute the Envelope of file_name in jobs processes and scan it for
+    silence. Return the envelope and the silence, which is the same as the
+    one returned by Envelope.get_silence. """
+    envelope, segments = analyse(file_name, jobs, pause_seconds,
+                                 silence_cap, window_seconds, engine,
+                                 parent_thread)
+    steps = stitch(envelope, pause_seconds, silence_cap, segments,
+                   parent_thread)
+    return envelope, envelope.silence(steps)
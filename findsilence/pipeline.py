@@ -0,0 +1,154 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Split a file while it is being analysed.
+
+The envelope is computed a few seconds at a time and scanned for silence as
+it grows. As soon as the pause after a track has begun, the track cannot
+change anymore and is handed to a Writer thread that copies it while the
+analysis goes on. """
+
+import os
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import findsilence
+from findsilence import defaults
+
+# Amount of frames analysed before the envelope is scanned again.
+chunk_frames = 2 ** 20
+
+
+class Writer(threading.Thread):
+    """ Thread writing the (number, from_pos, to_pos) tracks put into its
+    queue. It opens the file on its own, so that it does not interfere with
+    the position of the Audio object that is being analysed. Writing is
+    reported to notifier as phase 'write'. """
+    def __init__(self, file_name, directory, buffer_frames, notifier=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.audio = findsilence.Audio.from_file(file_name)
+        self.directory = directory
+        self.buffer_frames = buffer_frames
+        if notifier is None:
+            notifier = findsilence.DummyNotifier()
+        self.notifier = notifier
+        self.queue = queue.Queue()
+        self.stopped = threading.Event()
+        self.error = None
+
+    def run(self):
+        while True:
+            track = self.queue.get()
+            if track is None or self.stopped.is_set():
+                break
+            i, from_pos, to_pos = track
+            f_name = os.path.join(self.directory, "track_%.2d.wav" % i)
+            self.notifier.phase_start('write')
+            try:
+                self.audio.write_track(f_name, from_pos, to_pos,
+                                       self.buffer_frames)
+            except Exception as e:
+                self.error = e
+                break
+            self.notifier.phase_end('write', to_pos - from_pos)
+            self.notifier.count('bytes_written', (to_pos - from_pos) *
+                                self.audio.channels * self.audio.width)
+
+    def finish(self, cancel=False):
+        """ Wait for all tracks to be written, or only for the current one
+        if cancel is True. Re-raise errors of the thread. """
+        if cancel:
+            self.stopped.set()
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def split_phono(file_name, directory, pause_seconds=2, volume_cap=300,
+                min_length=10, parent_thread=None, engine=defaults.engine,
+                buffer_frames=defaults.buffer_frames):
+    """ Pipelined version of findsilence.split_phono for a fixed volume cap.
+    The directory has to exist. Return the amount of tracks written. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    audio = findsilence.Audio.from_file(file_name)
+    notifier = findsilence.get_notifier(parent_thread)
+    notifier.total_frames(audio.frames)
+    window_frames = max(1, int(defaults.window_seconds * audio.framerate))
+    envelope = findsilence.Envelope(audio.frames, audio.framerate,
+                                    window_frames)
+    windows = -(-audio.frames // window_frames)
+    chunk = max(1, chunk_frames // window_frames)
+    min_frames = min_length * audio.framerate
+
+    writer = Writer(file_name, directory, buffer_frames, notifier)
+    writer.start()
+    silence = []
+    written = 0
+    i = 0
+    try:
+        while len(envelope.rms) < windows:
+            if parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            notifier.phase_start('envelope')
+            first = envelope.position(len(envelope.rms))
+            envelope.rms.extend(audio.window_rms(
+                window_frames, len(envelope.rms), len(envelope.rms) + chunk,
+                engine=engine
+            ))
+            last = envelope.position(len(envelope.rms))
+            notifier.phase_end('envelope', last - first)
+            notifier.count('bytes_read', (last - first) * audio.channels *
+                           audio.width)
+            complete = len(envelope.rms) == windows
+            notifier.phase_start('scan')
+            for j, k, silent in envelope.scan(pause_seconds, volume_cap, i,
+                                              parent_thread):
+                if k >= len(envelope.rms) and not complete:
+                    # The step might go on in the windows to come.
+                    break
+                i = k
+                if not silent:
+                    continue
+                start = envelope.position(j)
+                if silence and silence[-1][1] == start:
+                    silence[-1][1] = envelope.position(k)
+                    continue
+                # A new pause begins, so the track before it is complete.
+                if silence:
+                    from_pos = silence[-1][1]
+                else:
+                    from_pos = 0
+                silence.append([start, envelope.position(k)])
+                if start - from_pos >= min_frames:
+                    writer.queue.put((written, from_pos, start))
+                    written += 1
+            notifier.phase_end('scan', last - first)
+            notifier.current_frame(last)
+    except:
+        writer.finish(cancel=True)
+        raise
+    writer.finish()
+    if not silence:
+        raise findsilence.NoSilence
+    notifier.done()
+    return written
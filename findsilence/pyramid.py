@@ -0,0 +1,176 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Coarse-to-fine silence search.
+
+This finds the same pauses as Envelope.get_silence with windows of
+defaults.window_seconds, without computing the volume of every window. The
+file is first read in coarse windows of several fine windows each. The scan
+then takes the steps of Envelope.scan; a step is a pause if the volume of
+its pause_seconds of windows is below the cap. The coarse windows lying
+inside a step give a lower bound of its energy, so most loud steps are
+decided on without looking closer. Only the steps where the bound is not
+enough, and the windows a pause is extended by, are read in fine windows.
+
+Every sample is still read once, for the coarse windows; what is saved is
+computing and keeping the volume of every fine window. Like the normal
+scan, pauses begin and end at fine windows, not at exact frames. """
+
+import array
+import math
+
+import findsilence
+from findsilence import defaults
+
+# Coarse windows are factor ** k fine windows, the largest such that every
+# step of the scan still contains at least one whole coarse window.
+factor = 8
+
+
+def coarse_windows(block):
+    """ Return the amount of fine windows in a coarse window for steps of
+    block windows, or 1 if the steps are too short to take coarse ones. """
+    size = 1
+    while size * factor * 2 <= block:
+        size *= factor
+    return size
+
+
+class Levels(object):
+    """ Volumes of the coarse windows of size fine windows of audio, and of
+    the fine windows within those that have been looked at. """
+    def __init__(self, audio, window_frames, size, parent_thread):
+        self.audio = audio
+        self.window_frames = window_frames
+        self.size = size
+        self.parent_thread = parent_thread
+        self.notifier = findsilence.get_notifier(parent_thread)
+        # Audio.rms may be below the true volume by up to rms_resolution.
+        self.resolution = audio.rms_resolution
+        self.windows = -(-audio.frames // window_frames)
+        # Cumulative energy of the coarse windows.
+        self.power = array.array('d', [0.0])
+        self.fine = {}
+    
+    def read_coarse(self):
+        """ Read the file in coarse windows. """
+        audio = self.audio
+        frames = self.size * self.window_frames
+        total = 0.0
+        audio.setpos(0)
+        for pos in xrange(0, audio.frames, frames):
+            if self.parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            n = min(frames, audio.frames - pos)
+            rms = audio.rms(audio.readframes(n))
+            total += rms * rms * n
+            self.power.append(total)
+            self.notifier.current_frame(pos + n)
+        self.notifier.count('frames_read', audio.frames)
+    
+    def position(self, window):
+        return min(window * self.window_frames, self.audio.frames)
+    
+    def rms(self, window):
+        """ Volume of fine window window, as Audio.window_rms has it. """
+        coarse = window // self.size
+        fine = self.fine.get(coarse)
+        if fine is None:
+            audio = self.audio
+            start = coarse * self.size
+            stop = min(start + self.size, self.windows)
+            audio.setpos(self.position(start))
+            fine = self.fine[coarse] = [
+                audio.rms(audio.readframes(self.position(i + 1) - 
+                                           self.position(i)))
+                for i in xrange(start, stop)
+            ]
+            self.notifier.count('frames_read', 
+                                self.position(stop) - self.position(start))
+        return fine[window - coarse * self.size]
+    
+    def loud(self, start, end, silence_cap):
+        """ Whether the coarse windows inside the windows start to end show
+        that their volume is at least silence_cap. """
+        if self.size == 1:
+            return False
+        first = -(-start // self.size)
+        last = end // self.size
+        if end == self.windows:
+            # The last coarse window may be shorter.
+            last = len(self.power) - 1
+        if last <= first:
+            return False
+        bound = self.power[last] - self.power[first]
+        frames = self.position(end) - self.position(start)
+        # The fine volumes add up to at least this, as each is below the
+        # true volume by less than the resolution.
+        bound -= 2 * self.resolution * math.sqrt(frames * max(0.0, bound))
+        return bound > silence_cap * silence_cap * frames * (1 + 1e-9)
+    
+    def block_rms(self, start, end):
+        """ Root-mean-square of the fine windows start to end. """
+        frames = self.position(end) - self.position(start)
+        if not frames:
+            return 0
+        power = 0.0
+        for i in xrange(start, end):
+            rms = self.rms(i)
+            power += rms * rms * (self.position(i + 1) - self.position(i))
+        return math.sqrt(power / frames)
+
+
+def get_silence(audio, pause_seconds=2, silence_cap=500, parent_thread=None):
+    """ Return the pauses in audio in the format of Envelope.get_silence,
+    which returns the same ones.
+
+    It returns to the position where the file was before. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    window_frames = max(1, int(defaults.window_seconds * audio.framerate))
+    envelope = findsilence.Envelope(audio.frames, audio.framerate,
+                                    window_frames)
+    block = envelope.windows(pause_seconds)
+    pos = audio.tell()
+    try:
+        levels = Levels(audio, window_frames, coarse_windows(block),
+                        parent_thread)
+        if levels.size > 1:
+            levels.read_coarse()
+        return envelope.silence(scan(levels, block, silence_cap,
+                                     parent_thread))
+    finally:
+        audio.setpos(pos)
+
+
+def scan(levels, block, silence_cap, parent_thread):
+    """ Yield the steps of Envelope.scan, looking at fine windows only where
+    the coarse ones leave the step open. """
+    n = levels.windows
+    i = 0
+    while i < n:
+        if parent_thread.is_stopped():
+            raise findsilence.Cancelled
+        j = min(i + block, n)
+        silent = not levels.loud(i, j, silence_cap) and \
+            levels.block_rms(i, j) < silence_cap
+        if silent:
+            while j < n:
+                j += 1
+                if levels.rms(j - 1) >= silence_cap:
+                    break
+        yield i, j, silent
+        i = j
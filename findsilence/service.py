@@ -0,0 +1,261 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Split the files put into an inbox directory as they arrive.
+
+The Service polls the inbox and hands every file that has stopped growing to
+a pool of worker processes, which stay alive between files. No more than
+queue_size files are handed out at once; the others wait in the inbox. Every
+file gets timeout seconds, after which its worker cancels it through
+parent_thread.is_stopped like the GUI does. Tracks go into a directory named
+after the file in the output directory. The state of the service and counts
+of the outcomes are written to a status file as JSON. """
+
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+import traceback
+
+import findsilence
+from findsilence import defaults
+
+OUTCOMES = ('done', 'nosilence', 'timeout', 'cancelled', 'failed')
+# Amount of finished files listed in the status file.
+recent_files = 20
+
+# Set in the worker processes when the service shuts down.
+_shutdown = None
+
+
+def init_worker(shutdown):
+    """ Initialize a worker process. Interrupts are handled by the service,
+    which then cancels the workers through shutdown. """
+    global _shutdown
+    _shutdown = shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class WorkerThread(object):
+    """ parent_thread of split_phono in a worker. It is stopped once the
+    deadline has passed or the service shuts down. """
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.notifier = findsilence.DummyNotifier()
+
+    def is_stopped(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            return True
+        return _shutdown is not None and _shutdown.is_set()
+
+    def timed_out(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+
+def split_file(job):
+    """ Split one file in a worker. job is a tuple of the input file, the
+    output directory, the timeout and the keyword arguments of split_phono.
+    Return the input file, the outcome, one of OUTCOMES, the amount of
+    tracks written, the seconds it took and an error message or None. """
+    file_name, directory, timeout, kwargs = job
+    started = time.time()
+    thread = WorkerThread(timeout and started + timeout)
+    written = 0
+    error = None
+    try:
+        written = findsilence.split_phono(file_name, directory,
+                                          parent_thread=thread, **kwargs)
+        outcome = 'done'
+    except findsilence.Cancelled:
+        outcome = 'timeout' if thread.timed_out() else 'cancelled'
+    except findsilence.NoSilence:
+        outcome = 'nosilence'
+    except Exception:
+        outcome = 'failed'
+        error = traceback.format_exc()
+    return file_name, outcome, written, time.time() - started, error
+
+
+class Service(object):
+    """ Split the files arriving in inbox into output with workers worker
+    processes. Split files, and those without silence, are moved into the
+    directory done, or left where they are and remembered if it is None.
+    Files that failed or timed out are left in the inbox and only tried
+    again once they change. kwargs are passed on to split_phono. """
+    def __init__(self, inbox, output, workers=defaults.jobs, done=None,
+                 queue_size=None, timeout=None,
+                 poll_seconds=defaults.poll_seconds, status_file=None,
+                 **kwargs):
+        self.inbox = inbox
+        self.output = output
+        self.workers = max(1, workers)
+        self.done = done
+        self.queue_size = queue_size or 2 * self.workers
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        self.status_file = status_file
+        self.kwargs = kwargs
+        self.pool = None
+        self.shutdown = multiprocessing.Event()
+        self.stopped = False
+        # Size and modification time of the files seen on the last poll.
+        self.seen = {}
+        # Files that are handled and their (size, mtime) when they were.
+        self.handled = {}
+        # Input file -> (AsyncResult, time it was handed out).
+        self.running = {}
+        self.waiting = []
+        self.counts = dict((outcome, 0) for outcome in OUTCOMES)
+        self.tracks = 0
+        self.busy_seconds = 0.0
+        self.recent = []
+        self.started = time.time()
+
+    def stop(self, signum=None, frame=None):
+        """ Stop the service after the current poll. It can be used as a
+        signal handler. """
+        self.stopped = True
+
+    def poll_inbox(self):
+        """ Return the files in the inbox that have not changed since the
+        last poll and are not handled yet. """
+        current = {}
+        ready = []
+        for name in sorted(os.listdir(self.inbox)):
+            path = os.path.join(self.inbox, name)
+            if not os.path.isfile(path) or \
+               os.path.splitext(name)[1].lower() not in \
+               findsilence.WAVE_EXTENSIONS:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime)
+            if self.seen.get(path) == current[path] and \
+               self.handled.get(path) != current[path]:
+                # It has stopped growing.
+                ready.append(path)
+        self.seen = current
+        return ready
+
+    def submit(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        directory = os.path.join(self.output, name)
+        self.handled[path] = self.seen[path]
+        self.running[path] = (
+            self.pool.apply_async(split_file, [(path, directory,
+                                                self.timeout, self.kwargs)]),
+            time.time()
+        )
+
+    def collect(self):
+        """ Account for the files the workers have finished. """
+        for path, (result, submitted) in list(self.running.items()):
+            if not result.ready():
+                continue
+            del self.running[path]
+            file_name, outcome, written, seconds, error = result.get()
+            self.counts[outcome] += 1
+            self.tracks += written
+            self.busy_seconds += seconds
+            self.recent.append({'file': file_name, 'outcome': outcome,
+                                'tracks': written, 'seconds': seconds,
+                                'error': error,
+                                'finished': time.time()})
+            del self.recent[:-recent_files]
+            if self.done is not None and outcome in ('done', 'nosilence'):
+                if not os.path.exists(self.done):
+                    os.makedirs(self.done)
+                shutil.move(path, os.path.join(self.done,
+                                               os.path.basename(path)))
+                del self.handled[path]
+
+    def step(self):
+        """ Poll the inbox once, hand out files while there is room and
+        write the status. """
+        self.collect()
+        ready = self.poll_inbox()
+        self.waiting = [path for path in ready if path not in self.running]
+        while self.waiting and len(self.running) < self.queue_size:
+            self.submit(self.waiting.pop(0))
+        self.write_status()
+
+    def status(self):
+        """ Return the state of the service as a dict. """
+        now = time.time()
+        uptime = now - self.started
+        finished = sum(self.counts.values())
+        return {'inbox': self.inbox, 'output': self.output,
+                'workers': self.workers, 'queue_size': self.queue_size,
+                'started': self.started, 'updated': now, 'uptime': uptime,
+                'running': dict((path, now - submitted) for path, (result,
+                                submitted) in self.running.items()),
+                'waiting': list(self.waiting), 'counts': self.counts,
+                'tracks': self.tracks,
+                'files_per_hour': finished * 3600 / uptime if uptime else 0,
+                'utilization': self.busy_seconds /
+                               (uptime * self.workers) if uptime else 0,
+                'recent': self.recent, 'stopped': self.stopped}
+
+    def write_status(self):
+        """ Replace the status file, so that readers never see half of
+        it. """
+        if self.status_file is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.status_file))
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(self.status(), f, indent=1, sort_keys=True)
+            finally:
+                f.close()
+            os.rename(temp, self.status_file)
+        except:
+            os.remove(temp)
+            raise
+
+    def run(self):
+        """ Run until stop is called. Files that are being split then are
+        cancelled, and handed out again the next time the service runs. """
+        if not os.path.exists(self.output):
+            os.makedirs(self.output)
+        self.pool = multiprocessing.Pool(self.workers, init_worker,
+                                         (self.shutdown, ))
+        try:
+            while not self.stopped:
+                self.step()
+                time.sleep(self.poll_seconds)
+        finally:
+            self.shutdown.set()
+            self.pool.close()
+            self.pool.join()
+            self.collect()
+            self.write_status()
+
+
+def serve(inbox, output, **kwargs):
+    """ Run a Service until SIGINT or SIGTERM. kwargs are the ones of
+    Service. """
+    service = Service(inbox, output, **kwargs)
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+    return service
@@ -0,0 +1,165 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Find the volume caps that split a file into a given amount of tracks.
+
+Here a pause is a run of windows that are all quieter than the volume cap
+and that is at least pause_seconds long; this is what Envelope.runs returns.
+Raising the cap only ever adds silent windows, so solve goes through the
+windows from the quietest to the loudest, joins them into runs as they become
+silent and keeps the amount of tracks up to date on every step. That gives
+the amount of tracks for every possible cap in one pass over the sorted
+windows, instead of scanning the envelope again for every cap tried.
+
+get_silence judges whole blocks instead, so a click in a pause does not break
+it there. Envelope.split_into therefore only takes the cap found here as its
+first guess and checks it against the pauses get_silence finds. """
+
+import array
+import bisect
+import math
+
+import findsilence
+
+
+class Thresholds(object):
+    """ Amount of tracks for every volume cap. caps[k] is the highest cap
+    of the k-th range of caps, which all yield counts[k] tracks. The first
+    range begins at zero. """
+    def __init__(self, caps, counts):
+        self.caps = caps
+        self.counts = counts
+
+    def ranges(self, tracks):
+        """ Return the (low, high) ranges of caps yielding tracks tracks. Caps
+        larger than low and not larger than high are in the range. """
+        ranges = []
+        for k, count in enumerate(self.counts):
+            if count != tracks:
+                continue
+            low = self.caps[k - 1] if k else 0
+            if ranges and ranges[-1][1] == low:
+                ranges[-1] = (ranges[-1][0], self.caps[k])
+            else:
+                ranges.append((low, self.caps[k]))
+        return ranges
+
+    def closest(self, tracks):
+        """ Return the achievable amounts of tracks closest to tracks, the
+        nearest smaller and the nearest larger one, None if there is none."""
+        smaller = [count for count in self.counts if count < tracks]
+        larger = [count for count in self.counts if count > tracks]
+        return (max(smaller) if smaller else None,
+                min(larger) if larger else None)
+
+    def cap(self, tracks):
+        """ Return a volume cap yielding tracks tracks. Of all ranges of caps
+        that do, the middle of the widest one is taken. Return None if
+        tracks cannot be reached. """
+        best = None
+        for low, high in self.ranges(tracks):
+            # Volume is perceived logarithmically.
+            width = math.log(max(high, 1)) - math.log(max(low, 1))
+            if best is None or width > best[0]:
+                best = (width, low, high)
+        if best is None:
+            return None
+        width, low, high = best
+        return min(high, math.sqrt(max(low, 1) * max(high, 1)))
+
+
+def solve(envelope, min_length, pause_seconds, parent_thread=None):
+    """ Return the Thresholds of envelope for tracks of at least min_length
+    seconds and pauses of at least pause_seconds. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    rms = envelope.rms
+    n = len(rms)
+    block = envelope.windows(pause_seconds)
+    min_frames = min_length * envelope.framerate
+    position = envelope.position
+
+    # Runs of silent windows: run_end[a] is the end of the run starting at a
+    # and run_start[b - 1] the start of the one ending at b.
+    silent = bytearray(n)
+    run_end = array.array('l', [0]) * n
+    run_start = array.array('l', [0]) * n
+    # Starts of the pauses, in order, and their ends.
+    starts = []
+    ends = {}
+    state = {'count': 0}
+
+    def long_enough(index):
+        """ Whether the track before the index-th pause is long enough. """
+        if index == 0:
+            from_pos = 0
+        else:
+            from_pos = position(ends[starts[index - 1]])
+        return position(starts[index]) - from_pos >= min_frames
+
+    def remove(start):
+        index = bisect.bisect_left(starts, start)
+        state['count'] -= long_enough(index)
+        if index + 1 < len(starts):
+            state['count'] -= long_enough(index + 1)
+        del starts[index]
+        del ends[start]
+        if index < len(starts):
+            state['count'] += long_enough(index)
+
+    def insert(start, end):
+        index = bisect.bisect_left(starts, start)
+        if index < len(starts):
+            state['count'] -= long_enough(index)
+        starts.insert(index, start)
+        ends[start] = end
+        state['count'] += long_enough(index)
+        if index + 1 < len(starts):
+            state['count'] += long_enough(index + 1)
+
+    order = sorted(xrange(n), key=rms.__getitem__)
+    caps = array.array('d')
+    result = array.array('l')
+    if n:
+        # Up to the lowest volume nothing is silent.
+        caps.append(rms[order[0]])
+        result.append(0)
+    for k, window in enumerate(order):
+        if not k % 4096 and parent_thread.is_stopped():
+            raise findsilence.Cancelled
+        start, end = window, window + 1
+        if window > 0 and silent[window - 1]:
+            start = run_start[window - 1]
+            if end - start - 1 >= block:
+                remove(start)
+        if end < n and silent[end]:
+            if run_end[end] - end >= block:
+                remove(end)
+            end = run_end[end]
+        silent[window] = 1
+        run_end[start] = end
+        run_start[end - 1] = start
+        if end - start >= block:
+            insert(start, end)
+        if k + 1 == n:
+            caps.append(rms[window] + 1)
+            result.append(state['count'])
+        elif rms[order[k + 1]] != rms[window]:
+            # All windows of this volume are silent now, which is the case
+            # for caps up to the next volume.
+            caps.append(rms[order[k + 1]])
+            result.append(state['count'])
+    return Thresholds(caps, result)
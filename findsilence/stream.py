@@ -0,0 +1,238 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Split wave or raw PCM data read from a pipe.
+
+The input is read once, front to back, and never seeked. Only the samples
+whose fate is still open are kept: those of the step the silence detection
+is looking at, which is at most pause_seconds long, and the beginning of a
+track until it is min_length seconds long and thus going to be written.
+Everything else is appended to the track file it belongs to or dropped if it
+is part of a pause. The tracks are the same as the ones split_phono would
+write for the same data. """
+
+import audioop
+import os
+
+import findsilence
+from findsilence import defaults, wave64
+
+
+class Splitter(object):
+    """ Split the frames passed to feed into tracks in directory. Call
+    finish once there are no more frames. """
+    def __init__(self, directory, channels, framerate, width,
+                 pause_seconds=2, volume_cap=300, min_length=10,
+                 parent_thread=None):
+        if parent_thread is None:
+            parent_thread = findsilence.DummyThread()
+        self.parent_thread = parent_thread
+        self.notifier = findsilence.get_notifier(parent_thread)
+        self.directory = directory
+        self.channels = channels
+        self.framerate = framerate
+        self.width = width
+        self.framesize = channels * width
+        self.volume_cap = volume_cap
+        self.min_frames = min_length * framerate
+        self.window_frames = max(1, int(defaults.window_seconds * framerate))
+        self.envelope = findsilence.Envelope(0, framerate, self.window_frames)
+        self.block = self.envelope.windows(pause_seconds)
+        self.silence = []
+        self.written = 0
+        # Frames not yet given to a track or dropped, beginning at frame
+        # base.
+        self.buffer = bytearray()
+        self.base = 0
+        # The scan state of findsilence.follow.Follower.
+        self.i = 0
+        self.run_end = None
+        # Beginning of the current track, which is kept in head until it is
+        # long enough to be written to track.
+        self.head = []
+        self.head_frames = 0
+        self.track = None
+        self.track_name = None
+        # Bytes written to track, counted once it is known to be kept.
+        self.track_bytes = 0
+
+    def feed(self, data):
+        """ Add data to the end of the input. """
+        self.buffer.extend(data)
+        frames = self.base + len(self.buffer) // self.framesize
+        self.analyse(frames // self.window_frames)
+        self.envelope.frames = len(self.envelope.rms) * self.window_frames
+        self.scan(False)
+        self.notifier.current_frame(self.envelope.frames)
+
+    def finish(self):
+        """ Analyse the rest of the input. The frames after the last pause
+        do not form a track, as in split_phono. Return the amount of tracks
+        written. """
+        frames = self.base + len(self.buffer) // self.framesize
+        self.analyse(-(-frames // self.window_frames), frames)
+        self.envelope.frames = frames
+        self.scan(True)
+        self.settle(frames, False)
+        if self.track is not None:
+            self.track.close()
+            os.remove(self.track_name)
+            self.track = None
+        return self.written
+
+    def analyse(self, windows, end=None):
+        """ Extend the envelope to windows windows, the last one ending at
+        frame end if given. """
+        rms = self.envelope.rms
+        window_frames = self.window_frames
+        while len(rms) < windows:
+            start = len(rms) * window_frames
+            stop = start + window_frames
+            if end is not None:
+                stop = min(stop, end)
+            rms.append(audioop.rms(
+                bytes(self.buffer[(start - self.base) * self.framesize:
+                                  (stop - self.base) * self.framesize]),
+                self.width
+            ))
+
+    def scan(self, complete):
+        """ Continue the silence detection of Envelope.scan as far as the
+        envelope goes and hand the frames it has decided on to settle. """
+        envelope = self.envelope
+        rms = envelope.rms
+        n = len(rms)
+        while self.i < n:
+            if self.parent_thread.is_stopped():
+                raise findsilence.Cancelled
+            if self.run_end is None:
+                if self.i + self.block > n and not complete:
+                    break
+                j = min(self.i + self.block, n)
+                if envelope.block_rms(self.i, j) >= self.volume_cap:
+                    self.i = j
+                    self.settle(envelope.position(j), True)
+                    continue
+                self.begin(envelope.position(self.i))
+                self.run_end = j
+            while self.run_end < n:
+                self.run_end += 1
+                if rms[self.run_end - 1] >= self.volume_cap:
+                    break
+            else:
+                if not complete:
+                    self.settle(envelope.position(self.run_end), False)
+                    break
+            end = envelope.position(self.run_end)
+            self.settle(end, False)
+            self.silence[-1][1] = end
+            self.i = self.run_end
+            self.run_end = None
+
+    def begin(self, start):
+        """ A pause begins at frame start, so the current track is complete
+        unless the pause continues the previous one. """
+        silence = self.silence
+        if silence and silence[-1][1] == start:
+            return
+        silence.append([start, start])
+        if self.track is None and self.head_frames >= self.min_frames:
+            # With a min_length of 0, split_phono writes the empty track 
+            # before a pause at the very beginning too.
+            self.open_track()
+        if self.track is not None:
+            self.track.close()
+            self.track = None
+            self.written += 1
+            self.notifier.count('bytes_written', self.track_bytes)
+        # Tracks shorter than min_length are dropped.
+        self.head = []
+        self.head_frames = 0
+
+    def settle(self, end, keep):
+        """ Frames up to end are decided on. Add them to the current track
+        if keep is True, otherwise drop them. """
+        size = (end - self.base) * self.framesize
+        if size <= 0:
+            return
+        if keep:
+            data = bytes(self.buffer[:size])
+            if self.track is not None:
+                self.track.writeframes(data)
+                self.track_bytes += len(data)
+            else:
+                self.head.append(data)
+                self.head_frames += end - self.base
+                if self.head_frames >= self.min_frames:
+                    self.open_track()
+        del self.buffer[:size]
+        self.base = end
+
+    def open_track(self):
+        """ The current track is long enough; start writing it. """
+        self.track_name = os.path.join(self.directory,
+                                       "track_%.2d.wav" % self.written)
+        # The length is not known yet, the header is fixed on close.
+        self.track = wave64.open_writer(self.track_name, self.channels,
+                                        self.width, self.framerate, 0)
+        self.track_bytes = 0
+        for data in self.head:
+            self.track.writeframes(data)
+            self.track_bytes += len(data)
+        self.head = []
+        self.head_frames = 0
+
+
+def split_phono(f, directory, pause_seconds=2, volume_cap=300, min_length=10,
+                parent_thread=None, buffer_frames=defaults.buffer_frames,
+                fmt=None):
+    """ Split the wave file read from the file object f, which may be a
+    pipe. If fmt is given as (channels, framerate, width), f holds raw
+    little-endian PCM instead. The directory has to exist. Return the amount
+    of tracks written. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    size = None
+    if fmt is None:
+        container, fmt, offset, size = wave64.read_header(f)
+        if size in (0, 0xFFFFFFFF):
+            # Written by a program that did not know the length; read up to
+            # the end.
+            size = None
+    channels, framerate, width = fmt
+    splitter = Splitter(directory, channels, framerate, width,
+                        pause_seconds, volume_cap, min_length, parent_thread)
+    notifier = findsilence.get_notifier(parent_thread)
+    notifier.phase_start('stream')
+    chunk = buffer_frames * channels * width
+    read = 0
+    while size is None or read < size:
+        if parent_thread.is_stopped():
+            raise findsilence.Cancelled
+        if size is not None:
+            chunk = min(chunk, size - read)
+        data = f.read(chunk)
+        if not data:
+            break
+        read += len(data)
+        notifier.count('bytes_read', len(data))
+        splitter.feed(data)
+    written = splitter.finish()
+    notifier.phase_end('stream', splitter.envelope.frames)
+    if not splitter.silence:
+        raise findsilence.NoSilence
+    notifier.done()
+    return written
@@ -0,0 +1,201 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Try a grid of settings on a file.
+
+The file is read once into its Envelope. Every combination of pause length,
+volume cap and minimal track length is then evaluated on the envelope, which
+is cheap, and the tracks they give are returned as a table. Run it as
+'findsilence sweep'. """
+
+import csv
+import json
+import os
+import sys
+
+# Enable users to run the file without installing the program.
+if __name__ == "__main__":
+    sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                 os.pardir))
+
+from optparse import OptionParser
+
+import findsilence
+from findsilence import defaults
+from findsilence.cache import Cache
+
+FORMATS = ('json', 'csv')
+COLUMNS = ('pause_seconds', 'volume_cap', 'min_length', 'tracks', 'pauses',
+           'boundaries')
+
+
+def sweep(file_name, pause_seconds, volume_caps, min_lengths,
+          parent_thread=None, engine=defaults.engine, jobs=1, cache=None,
+          analysis_rate=None):
+    """ Return the framerate of file_name and a row for every combination
+    of the values in pause_seconds, volume_caps and min_lengths. A row is a
+    dict of these settings, the amount of tracks and pauses they give and
+    the boundaries of the tracks as a list of (from_pos, to_pos) frames.
+    The other arguments are the ones of findsilence.analyse. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    notifier = findsilence.get_notifier(parent_thread)
+    audio = analysed = findsilence.Audio.from_file(file_name)
+    if analysis_rate:
+        analysed = findsilence.Proxy(audio, analysis_rate)
+        jobs = 1
+    notifier.total_frames(analysed.frames)
+    envelope = None
+    if cache is not None:
+        envelope = cache.load(file_name, analysis_rate=analysis_rate)
+    if envelope is None:
+        notifier.phase_start('envelope')
+        if jobs > 1:
+            from findsilence import parallel
+            envelope = parallel.envelope(file_name, jobs, engine=engine,
+                                         parent_thread=parent_thread)
+        else:
+            envelope = analysed.envelope(parent_thread=parent_thread,
+                                         engine=engine)
+        notifier.phase_end('envelope', analysed.frames)
+        if cache is not None:
+            cache.store(file_name, envelope, analysis_rate=analysis_rate)
+
+    rows = []
+    notifier.phase_start('scan')
+    for pause in pause_seconds:
+        for cap in volume_caps:
+            silence = envelope.get_silence(pause, cap, parent_thread)
+            if analysed is not audio:
+                silence = analysed.map_silence(silence)
+            for min_length in min_lengths:
+                tracks = list(audio.tracks(silence, min_length))
+                rows.append({'pause_seconds': pause, 'volume_cap': cap,
+                             'min_length': min_length, 'tracks': len(tracks),
+                             'pauses': len(silence), 'boundaries': tracks})
+    notifier.phase_end('scan')
+    notifier.done()
+    return audio.framerate, rows
+
+
+def to_json(file_name, framerate, rows):
+    """ Return the rows of file_name as a JSON document. """
+    return json.dumps({'file': file_name, 'framerate': framerate,
+                       'rows': rows}, sort_keys=True)
+
+
+def to_csv(f, rows):
+    """ Write the rows to the file object f as CSV with a header line. The
+    boundaries are written as from_pos:to_pos pairs separated by spaces. """
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([row[column] for column in COLUMNS[:-1]] +
+                        [' '.join('%d:%d' % track
+                                  for track in row['boundaries'])])
+
+
+def parse_values(text, type=float):
+    """ Parse a list of values such as "1,2,5" or a range "100:400:50",
+    which includes both ends. """
+    values = []
+    for part in text.split(','):
+        if ':' in part:
+            start, stop, step = [type(value) for value in part.split(':')]
+            if step <= 0:
+                raise ValueError("step must be positive")
+            value = start
+            while value <= stop + step * 1e-9:
+                values.append(value)
+                value += step
+        else:
+            values.append(type(part))
+    return values
+
+
+def main(argv=None):
+    """ Entry point of 'findsilence sweep'. """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser("findsilence sweep [options] input file")
+    parser.add_option("-p", "--pause", action="store", type="string",
+                      dest="pause", metavar="SECONDS",
+                      default=str(defaults.pause_seconds),
+                      help="pause lengths to try, e.g. 1,2,3 or 1:3:0.5")
+    parser.add_option("-s", "--silence", action="store", type="string",
+                      dest="volume_cap", metavar="VOLUMES",
+                      default=str(defaults.volume_cap),
+                      help="volume caps to try, e.g. 100,200 or 100:400:50")
+    parser.add_option("-m", "--min", action="store", type="string",
+                      dest="min_", metavar="SECONDS",
+                      default=str(defaults.min_length),
+                      help="minimal track lengths to try")
+    parser.add_option("-e", "--engine", action="store", type="choice",
+                      dest="engine", metavar="ENGINE",
+                      choices=findsilence.ENGINES, default=defaults.engine,
+                      help="silence detection engine: %s" %
+                      ", ".join(findsilence.ENGINES))
+    parser.add_option("-j", "--jobs", action="store", type="int",
+                      dest="jobs", metavar="N", default=defaults.jobs,
+                      help="analyse the file in N processes")
+    parser.add_option("-r", "--analysis-rate", action="store", type="int",
+                      dest="analysis_rate", metavar="HZ", default=None,
+                      help="analyse a mono copy resampled to HZ")
+    parser.add_option("-c", "--cache", action="store_true", dest="cache",
+                      default=False, help="keep the analysis of the input "
+                      "file in the cache directory and reuse it")
+    parser.add_option("--cache-dir", action="store", type="string",
+                      dest="cache_dir", metavar="DIRECTORY", default=None,
+                      help="use DIRECTORY as cache directory, implies --cache")
+    parser.add_option("-f", "--format", action="store", type="choice",
+                      dest="format", metavar="FORMAT", choices=FORMATS,
+                      default='json',
+                      help="write the table as %s" % " or ".join(FORMATS))
+    parser.add_option("-o", "--output", action="store", type="string",
+                      dest="output", metavar="FILE", default=None,
+                      help="write the table to FILE instead of stdout")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("Give exactly one input file")
+    try:
+        pause_seconds = parse_values(options.pause)
+        volume_caps = parse_values(options.volume_cap, int)
+        min_lengths = parse_values(options.min_)
+    except ValueError as e:
+        parser.error("Invalid values: %s" % e)
+
+    cache = None
+    if options.cache or options.cache_dir:
+        cache = Cache(options.cache_dir or defaults.cache_dir)
+    framerate, rows = sweep(args[0], pause_seconds, volume_caps, min_lengths,
+                            engine=options.engine, jobs=options.jobs,
+                            cache=cache, analysis_rate=options.analysis_rate)
+    if options.output is None:
+        f = sys.stdout
+    else:
+        f = open(options.output, 'w')
+    try:
+        if options.format == 'csv':
+            to_csv(f, rows)
+        else:
+            f.write(to_json(args[0], framerate, rows) + '\n')
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+if __name__ == "__main__":
+    main()
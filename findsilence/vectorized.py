@@ -0,0 +1,304 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Silence detection engine using NumPy.
+
+Instead of calling rms for every block, large blocks of the file are decoded
+into arrays and the volumes of many blocks are computed at once. The results
+are the same as the ones of the pure Python engine in Audio. This needs the
+width and channels attributes of the Audio object.
+
+Importing this module raises ImportError if NumPy is not installed. """
+
+import numpy
+
+import findsilence
+
+# Amount of frames that are decoded at once.
+block_frames = 2 ** 20
+# get_silence first sums up this fraction of every block. Most loud blocks
+# are found to be loud from that alone.
+loud_fraction = 8
+
+
+def decode(data, width):
+    """ Return the samples in data as an array. Like audioop, 8 bit samples
+    are considered signed. """
+    if width == 1:
+        return numpy.frombuffer(data, numpy.int8)
+    elif width == 2:
+        return numpy.frombuffer(data, '<i2')
+    elif width == 3:
+        raw = numpy.frombuffer(data, numpy.uint8).reshape(-1, 3)
+        samples = (raw[:, 0].astype(numpy.int32) |
+                   (raw[:, 1].astype(numpy.int32) << 8) |
+                   (raw[:, 2].astype(numpy.int32) << 16))
+        # Sign-extend the 24 bit values.
+        return (samples << 8) >> 8
+    elif width == 4:
+        return numpy.frombuffer(data, '<i4')
+    else:
+        raise ValueError("Unsupported sample width %d" % width)
+
+
+def accumulator(width):
+    """ Type the squares of samples of width bytes are summed up in. Up to
+    16 bit the sums are exact integers, so the results equal the ones of
+    audioop. """
+    if width <= 2:
+        return numpy.int64
+    return numpy.float64
+
+
+def window_energy(samples, width, channels, window_frames):
+    """ Return the sum of squares of every window of window_frames frames of
+    the samples of width bytes and the amount of samples in every window.
+    The last window may be shorter. """
+    size = window_frames * channels
+    full = len(samples) // size * size
+    windows = samples[:full].reshape(-1, size)
+    energy = numpy.einsum('ij,ij->i', windows, windows,
+                          dtype=accumulator(width))
+    lengths = numpy.empty(len(energy), numpy.int64)
+    lengths.fill(size)
+    if full < len(samples):
+        rest = samples[full:]
+        energy = numpy.append(energy, numpy.einsum(
+            'i,i->', rest, rest, dtype=accumulator(width)
+        ))
+        lengths = numpy.append(lengths, len(rest))
+    return energy, lengths
+
+
+def decimate(data, width, channels, factor, proxy_width):
+    """ Return the samples findsilence.Proxy.readframes makes of the frames
+    in data: every factor-th frame, mixed down to one channel, of samples of
+    proxy_width bytes. The other frames are skipped by a strided view and
+    never decoded. """
+    frame_size = width * channels
+    frames = numpy.frombuffer(data, 'V%d' % frame_size,
+                              len(data) // frame_size)
+    samples = decode(frames[::factor].copy(), width)
+    # Keep the upper proxy_width bytes, like audioop.lin2lin.
+    samples = (samples >> 8 * (width - proxy_width)).reshape(-1, channels)
+    if channels == 1:
+        return samples[:, 0]
+    elif channels == 2:
+        # What audioop.tomono with factors of 0.5 rounds down to.
+        return (samples[:, 0].astype(numpy.int32) + samples[:, 1]) >> 1
+    # Mix them down the way audioop.mul and audioop.add do: every product
+    # is rounded down and every sum is clipped.
+    limit = 2 ** (8 * proxy_width - 1)
+    mono = None
+    for channel in xrange(channels):
+        channel = numpy.floor(samples[:, channel] * (1.0 / channels))
+        if mono is None:
+            mono = channel
+        else:
+            mono = numpy.clip(mono + channel, -limit, limit - 1)
+    return mono.astype(numpy.int32)
+
+
+def volume(energy, samples):
+    """ Root-mean-square computed the same way as audioop.rms does. """
+    return numpy.sqrt(energy / samples.astype(numpy.float64)).astype(
+        numpy.int64
+    )
+
+
+def reader(audio):
+    """ Return a function reading the given amount of frames from audio and
+    returning their samples. The frames of a findsilence.Proxy are picked
+    out of the original by decimate. """
+    if isinstance(audio, findsilence.Proxy):
+        source = audio.audio
+
+        def read(frames):
+            return decimate(source.readframes(frames * audio.factor),
+                            source.width, source.channels, audio.factor,
+                            audio.width)
+    else:
+        def read(frames):
+            return decode(audio.readframes(frames), audio.width)
+    return read
+
+
+class Samples(object):
+    """ Samples of audio, decoded on demand. Only the frames from the last
+    position passed as keep are held. """
+    def __init__(self, audio, start):
+        self.frames = audio.frames
+        self.channels = audio.channels
+        self.width = audio.width
+        # Volumes of a findsilence.Proxy are scaled to the original.
+        self.scale = 1
+        if isinstance(audio, findsilence.Proxy):
+            self.scale = audio.scale
+        self.audio = audio
+        self.read = reader(audio)
+        self.base = start
+        self.samples = decode(b'', audio.width)
+
+    @property
+    def end(self):
+        """ Frame up to which the samples are known. """
+        return self.base + len(self.samples) // self.channels
+
+    def ensure(self, frame, keep):
+        """ Make the samples up to frame available. Frames before keep are
+        not needed anymore. """
+        frame = min(frame, self.frames)
+        if self.end >= frame:
+            return
+        # The frames from keep on are read again instead of being copied
+        # along. For a MappedWave, the samples are a view of the mapping,
+        # so neither copies anything.
+        self.audio.setpos(keep)
+        self.samples = self.read(max(block_frames, frame - keep))
+        self.base = keep
+        if self.end < frame:
+            # File is shorter than it claims to be.
+            self.frames = self.end
+
+    def volumes(self, start, blocks, length, silence_cap):
+        """ Volume of blocks consecutive blocks of length frames beginning
+        at start, and their ends. The last block is cut off at the end of
+        the file. A block whose first part alone is as loud as silence_cap
+        is not summed up any further; its volume is only known to be at 
+        least silence_cap then. """
+        starts = start + length * numpy.arange(blocks, dtype=numpy.int64)
+        ends = numpy.minimum(starts + length, self.frames)
+        size = length * self.channels
+        offset = (start - self.base) * self.channels
+        full = blocks if ends[-1] - starts[-1] == length else blocks - 1
+        # Sum up every block on its own, straight from the samples.
+        windows = self.samples[offset:offset + full * size].reshape(-1, size)
+        part = size // loud_fraction
+        energy = numpy.einsum('ij,ij->i', windows[:, :part],
+                              windows[:, :part], dtype=accumulator(self.width))
+        rest = numpy.flatnonzero(
+            volume(energy, numpy.int64(size)) * self.scale < silence_cap
+        )
+        if len(rest):
+            windows = windows[rest, part:]
+            energy[rest] += numpy.einsum('ij,ij->i', windows, windows,
+                                         dtype=accumulator(self.width))
+        if full < blocks:
+            rest = self.samples[offset + full * size:
+                                (ends[-1] - self.base) * self.channels]
+            energy = numpy.append(energy, numpy.einsum(
+                'i,i->', rest, rest, dtype=accumulator(self.width)
+            ))
+        return volume(energy, (ends - starts) * self.channels) * \
+            self.scale, ends
+
+
+def first_block(samples, start, length, silence_cap, silent, parent_thread):
+    """ Search blocks of length frames beginning at start for the first one
+    that is silent (or not silent if silent is False). Return start and end
+    of that block, or None and the end of the file if there is none. About
+    every percent of the file, cancellation is checked for and progress
+    reported. """
+    step = max(length, min(block_frames, samples.frames // 100))
+    while start < samples.frames:
+        if parent_thread.is_stopped():
+            raise findsilence.Cancelled
+        stop = min(start + step, samples.frames)
+        samples.ensure(stop + length, start)
+        if start >= samples.frames:
+            break
+        stop = min(stop, samples.frames)
+        blocks = -(-(stop - start) // length)
+        volumes, ends = samples.volumes(start, blocks, length, silence_cap)
+        if silent:
+            found = numpy.flatnonzero(volumes < silence_cap)
+        else:
+            found = numpy.flatnonzero(volumes >= silence_cap)
+        if len(found):
+            return start + int(found[0]) * length, int(ends[found[0]])
+        start = int(ends[-1])
+        parent_thread.notifier.current_frame(start)
+    return None, samples.frames
+
+
+def get_silence(audio, pause_seconds=2, silence_cap=500, parent_thread=None):
+    """ Vectorized equivalent of Audio.get_silence. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    read_frames = int(pause_seconds * audio.framerate)
+    afterloop_frames = 20
+    initpos = i = audio.tell()
+    samples = Samples(audio, initpos)
+    silence = []
+    try:
+        while i < samples.frames:
+            # Skip all loud blocks at once.
+            i, end = first_block(samples, i, read_frames, silence_cap, True,
+                                 parent_thread)
+            if i is None:
+                break
+            # Continue in steps of afterloop_frames up to and including the
+            # first chunk that is not silent.
+            start, end = first_block(samples, end, afterloop_frames,
+                                     silence_cap, False, parent_thread)
+            if silence and silence[-1][1] == i:
+                silence[-1][1] = end
+            else:
+                silence.append([i, end])
+            i = end
+            parent_thread.notifier.current_frame(i)
+    finally:
+        audio.setpos(initpos)
+    return silence
+
+
+def envelope_rms(audio, window_frames, parent_thread=None, start=0,
+                 stop=None):
+    """ Return the volume of every window of window_frames frames of audio
+    from window start up to window stop, or the end of the file, as an array
+    of doubles. """
+    if parent_thread is None:
+        parent_thread = findsilence.DummyThread()
+    end = audio.frames
+    if stop is not None:
+        end = min(stop * window_frames, end)
+    # Volumes of a findsilence.Proxy are scaled to the original.
+    scale = 1
+    if isinstance(audio, findsilence.Proxy):
+        scale = audio.scale
+    read = reader(audio)
+    pos = audio.tell()
+    i = start * window_frames
+    audio.setpos(i)
+    # Decode a whole number of windows at once.
+    read_frames = max(1, block_frames // window_frames) * window_frames
+    rms = []
+    while i < end:
+        if parent_thread.is_stopped():
+            audio.setpos(pos)
+            raise findsilence.Cancelled
+        energy, lengths = window_energy(read(min(read_frames, end - i)),
+                                        audio.width, audio.channels,
+                                        window_frames)
+        if not len(energy):
+            break
+        rms.append(volume(energy, lengths) * scale)
+        i += int(lengths.sum()) // audio.channels
+        parent_thread.notifier.current_frame(i)
+    audio.setpos(pos)
+    if not rms:
+        return numpy.zeros(0)
+    return numpy.concatenate(rms).astype(numpy.float64)
@@ -0,0 +1,226 @@
+# findsilence - Split long WAV files into tracks
+# Copyright (C) 2008 Florian Mayer
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Wave containers for files larger than 4 GB.
+
+RIFF stores sizes in 32 bits. RF64 and BW64 are RIFF with a ds64 chunk
+holding the 64 bit sizes; the 32 bit fields are set to 0xFFFFFFFF. Sony
+Wave64 uses GUIDs instead of four letter chunk names and 64 bit sizes
+everywhere. read_header understands all of them; Writer writes RF64 and BW64
+and open_writer only uses them for tracks that do not fit into RIFF. """
+
+import struct
+import wave
+
+CONTAINERS = ('wave', 'rf64', 'bw64', 'w64')
+# Largest RIFF size that fits into the 32 bit field.
+RIFF_LIMIT = 0xFFFFFFFF
+
+_W64_TAIL = b'\xf3\xac\xd3\x11\x8c\xd1\x00\xc0\x4f\x8e\xdb\x8a'
+W64_RIFF = b'riff\x2e\x91\xcf\x11\xa5\xd6\x28\xdb\x04\xc1\x00\x00'
+W64_WAVE = b'wave' + _W64_TAIL
+W64_FMT = b'fmt ' + _W64_TAIL
+W64_DATA = b'data' + _W64_TAIL
+
+
+def parse_fmt(data):
+    """ Return (channels, framerate, width) of the PCM fmt chunk data. """
+    if len(data) < 16:
+        raise wave.Error("fmt chunk too short")
+    tag, channels, framerate, byterate, align, bits = struct.unpack(
+        '<HHIIHH', data[:16]
+    )
+    if tag == 0xFFFE and len(data) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE, the real tag is in the sub-format.
+        tag, = struct.unpack('<H', data[24:26])
+    if tag != 1:
+        raise wave.Error("unknown format: %r" % (tag, ))
+    return channels, framerate, (bits + 7) // 8
+
+
+def read(f, size):
+    """ Read exactly size bytes from f. """
+    data = f.read(size)
+    if len(data) < size:
+        raise wave.Error("file ends within the header")
+    return data
+
+
+def read_header(f):
+    """ Parse the header of the wave file f up to the samples. Return the
+    container, one of CONTAINERS, the fmt chunk as (channels, framerate,
+    width) and the offset and size of the data chunk. f is only read
+    forward, so it may be a pipe. """
+    magic = read(f, 4)
+    if magic == W64_RIFF[:4]:
+        return ('w64', ) + read_w64_header(f)
+    if magic not in (b'RIFF', b'RF64', b'BW64'):
+        raise wave.Error("file does not start with RIFF id")
+    size, wave_ = struct.unpack('<I4s', read(f, 8))
+    if wave_ != b'WAVE':
+        raise wave.Error("not a WAVE file")
+    offset = 12
+    fmt = None
+    data_size = None
+    while True:
+        name, size = struct.unpack('<4sI', read(f, 8))
+        offset += 8
+        if name == b'data':
+            if fmt is None:
+                raise wave.Error("data chunk before fmt chunk")
+            if size == 0xFFFFFFFF and data_size is not None:
+                size = data_size
+            if magic == b'RIFF':
+                container = 'wave'
+            else:
+                container = magic.decode('ascii').lower()
+            return container, fmt, offset, size
+        # Chunks are word-aligned.
+        data = read(f, size + size % 2)
+        offset += len(data)
+        if name == b'ds64':
+            riff_size, data_size, samples = struct.unpack('<QQQ',
+                                                          data[:24])
+        elif name == b'fmt ':
+            fmt = parse_fmt(data[:size])
+
+
+def read_w64_header(f):
+    """ Parse the rest of the header of the Wave64 file f, after the first
+    four bytes. Return values are the same as for read_header, without the
+    container. """
+    header = read(f, 36)
+    if W64_RIFF[4:] != header[:12] or header[20:] != W64_WAVE:
+        raise wave.Error("not a Wave64 file")
+    offset = 40
+    fmt = None
+    while True:
+        guid, size = struct.unpack('<16sQ', read(f, 24))
+        offset += 24
+        # Sizes include the header; chunks are aligned to 8 bytes.
+        size -= 24
+        if guid == W64_DATA:
+            if fmt is None:
+                raise wave.Error("data chunk before fmt chunk")
+            return fmt, offset, size
+        data = read(f, size + -size % 8)
+        offset += len(data)
+        if guid == W64_FMT:
+            fmt = parse_fmt(data[:size])
+
+
+def riff_header(channels, width, framerate, nframes):
+    """ Return the header of a RIFF wave file of nframes frames, as written
+    by wave.Wave_write. """
+    data_size = nframes * channels * width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, framerate, framerate * channels * width,
+        channels * width, width * 8,
+        b'data', data_size
+    )
+
+
+def rf64_header(channels, width, framerate, nframes, container='rf64'):
+    """ Return the header of an RF64 or BW64 file of nframes frames. """
+    data_size = nframes * channels * width
+    return struct.pack(
+        '<4sI4s4sIQQQI4sIHHIIHH4sI',
+        container.upper().encode('ascii'), 0xFFFFFFFF, b'WAVE',
+        b'ds64', 28, 72 + data_size + data_size % 2, data_size, nframes, 0,
+        b'fmt ', 16, 1, channels, framerate, framerate * channels * width,
+        channels * width, width * 8,
+        b'data', 0xFFFFFFFF
+    )
+
+
+def fits(data_size):
+    """ Whether data_size bytes of samples fit into a RIFF wave file. """
+    return 36 + data_size + data_size % 2 <= RIFF_LIMIT
+
+
+def header(channels, width, framerate, nframes, container='wave'):
+    """ Return the header of the file open_writer would write for nframes
+    frames. """
+    if fits(nframes * channels * width):
+        return riff_header(channels, width, framerate, nframes)
+    return rf64_header(channels, width, framerate, nframes,
+                       'bw64' if container == 'bw64' else 'rf64')
+
+
+class Writer(object):
+    """ Write an RF64 or BW64 file of nframes frames. Like wave.Wave_write
+    the samples are passed to writeframes as they come; if there turn out
+    to be more or less than nframes frames, the header is corrected on
+    close. """
+    def __init__(self, file_name, channels, width, framerate, nframes=0,
+                 container='rf64'):
+        if container not in ('rf64', 'bw64'):
+            raise ValueError("Cannot write %r files" % (container, ))
+        self.channels = channels
+        self.width = width
+        self.framerate = framerate
+        self.container = container
+        self.nframes = nframes
+        self.written = 0
+        self._file = open(file_name, 'wb')
+        try:
+            self._file.write(self.header(nframes))
+        except:
+            self._file.close()
+            raise
+
+    def header(self, nframes):
+        """ Return the header for nframes frames. """
+        return rf64_header(self.channels, self.width, self.framerate,
+                           nframes, self.container)
+
+    def writeframes(self, data):
+        self._file.write(data)
+        self.written += len(data) // (self.channels * self.width)
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            if self.written * self.channels * self.width % 2:
+                self._file.write(b'\0')
+            if self.written != self.nframes:
+                self._file.seek(0)
+                self._file.write(self.header(self.written))
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def open_writer(file_name, channels, width, framerate, nframes,
+                container='wave'):
+    """ Open file_name for writing nframes frames. It becomes a RIFF wave
+    file if they fit, otherwise an RF64 file, or a BW64 file if container
+    is 'bw64'. The returned object has the writeframes and close methods
+    of wave.Wave_write. """
+    if not fits(nframes * channels * width):
+        return Writer(file_name, channels, width, framerate, nframes,
+                      'bw64' if container == 'bw64' else 'rf64')
+    f = wave.open(file_name, 'wb')
+    f.setnchannels(channels)
+    f.setsampwidth(width)
+    f.setframerate(framerate)
+    # Knowing the length up front saves patching the header after every
+    # chunk.
+    f.setnframes(nframes)
+    return f
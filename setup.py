@@ -35,6 +35,7 @@ setup(
     entry_points = {
         'console_scripts': [
             'findsilence = findsilence.main:main',
+            'findsilence-benchmark = findsilence.benchmark:main',
             ],
     },
 )